@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Generador de exportaciones sintéticas del ERP para pruebas de rendimiento.
+
+Produce libros con la forma de los Excel reales: CN, Descripcion, PVP como texto
+('12,34€'), Stock Actual, categoría 'DERMO-ACNE', columnas auxiliares del ERP y
+ventas como TOTAL o como columnas mensuales 'Ventas_Enero'... Las ventas anuales
+siguen una ley de Zipf por ranking, de modo que hay pocos productos A y una
+larga cola de C, D y E, como en una farmacia real.
+
+Uso:
+    python benchmarks/generar_exportacion.py 100000 -o benchmarks/datos/100k.xlsx
+    python benchmarks/generar_exportacion.py 10000 --mensual --semilla 3
+"""
+import argparse
+import importlib.util
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gestion_stock.configuracion import FAMILIAS_MAP  # noqa: E402
+
+MESES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+         'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+SUBCATEGORIAS = ['ACNE', 'SOLAR', 'GENERAL', 'BEBE', 'PIES', 'CAPILAR', 'CORPORAL', 'ORAL', 'DOLOR', 'TOS']
+FORMAS = ['crema', 'comprimidos', 'jarabe', 'gel', 'spray', 'sobres', 'cápsulas', 'loción']
+# Prefijos que no están en FAMILIAS_MAP (acaban en OTROS)
+PREFIJOS_DESCONOCIDOS = ['XYZ', 'PROMO', 'D']
+
+# Ventas anuales del producto más vendido y exponente de la ley de Zipf
+VENTAS_MAXIMAS = 4000
+EXPONENTE_ZIPF = 1.05
+VENTAS_SUELTAS = 0.7
+# Proporción de categorías vacías y de productos sobre-almacenados
+PROPORCION_SIN_CATEGORIA = 0.01
+PROPORCION_SOBRESTOCK = 0.25
+
+
+def generar_columnas(filas, semilla=0, mensual=False):
+    """Columnas del libro sintético como {nombre: lista o array}, en el orden del ERP"""
+    r = np.random.default_rng(semilla)
+    
+    # Ventas anuales por ranking de Zipf, repartidas al azar entre los productos, más
+    # ventas sueltas en la cola (la mitad del catálogo vende algo cada año)
+    ranking = r.permutation(filas) + 1
+    ventas = (np.floor(VENTAS_MAXIMAS * ranking ** -EXPONENTE_ZIPF * r.lognormal(0, 0.3, filas))
+              + r.poisson(VENTAS_SUELTAS, filas))
+    
+    prefijos = np.array(list(FAMILIAS_MAP) + PREFIJOS_DESCONOCIDOS, dtype=object)
+    categorias = (prefijos[r.integers(0, len(prefijos), filas)] + '-'
+                  + np.array(SUBCATEGORIAS, dtype=object)[r.integers(0, len(SUBCATEGORIAS), filas)])
+    categorias[r.random(filas) < PROPORCION_SIN_CATEGORIA] = None
+    
+    # Stock cercano a 20 días de venta, con una parte de productos sobre-almacenados
+    stock = r.poisson(ventas / 300 * 20) + (r.random(filas) < PROPORCION_SOBRESTOCK) * r.integers(1, 30, filas)
+    pvp = np.round(r.lognormal(2.3, 0.8, filas), 2).clip(0.5, 900)
+    formas = np.array(FORMAS, dtype=object)[r.integers(0, len(FORMAS), filas)]
+    
+    columnas = {
+        'CN': 600000 + r.choice(400000 if filas <= 400000 else filas * 2, filas, replace=False),
+        'Descripcion': [f"PRODUCTO {i} {forma}" for i, forma in enumerate(formas.tolist())],
+        'Laboratorio': [f"LAB {n}" for n in r.integers(1, 300, filas).tolist()],
+        'PVP': [f"{v:.2f}€".replace('.', ',') for v in pvp.tolist()],
+        'Stock Actual': stock,
+        'Stock Minimo': r.integers(0, 5, filas),
+        'Categoria': categorias.tolist(),
+    }
+    if mensual:
+        por_mes = r.multinomial(ventas.astype(np.int64), np.full(12, 1 / 12))
+        for i, mes in enumerate(MESES):
+            columnas[f'Ventas_{mes}'] = por_mes[:, i]
+    else:
+        columnas['TOTAL'] = ventas.astype(np.int64)
+    return columnas
+
+def _filas(columnas):
+    valores = [c.tolist() if isinstance(c, np.ndarray) else c for c in columnas.values()]
+    return zip(*valores)
+
+def escribir_xlsx(columnas, ruta):
+    """Escribe el libro en streaming (xlsxwriter si está instalado, openpyxl write_only si no)"""
+    if importlib.util.find_spec('xlsxwriter') is not None:
+        import xlsxwriter
+        
+        libro = xlsxwriter.Workbook(str(ruta), {'constant_memory': True})
+        hoja = libro.add_worksheet('Hoja1')
+        hoja.write_row(0, 0, list(columnas))
+        for i, fila in enumerate(_filas(columnas), start=1):
+            hoja.write_row(i, 0, fila)
+        libro.close()
+        return
+    
+    from openpyxl import Workbook
+    
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Hoja1')
+    hoja.append(list(columnas))
+    for fila in _filas(columnas):
+        hoja.append(fila)
+    libro.save(ruta)
+
+def generar_exportacion(filas, ruta, semilla=0, mensual=False):
+    """Genera y escribe una exportación sintética de 'filas' productos"""
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    escribir_xlsx(generar_columnas(filas, semilla, mensual), ruta)
+    return ruta
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera una exportación sintética del ERP")
+    parser.add_argument('filas', type=int, help="Número de productos (p. ej. 1000, 10000, 100000, 1000000)")
+    parser.add_argument('-o', '--salida', help="Archivo .xlsx (por defecto: benchmarks/datos/<filas>.xlsx)")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--mensual', action='store_true', help="Ventas por mes en lugar de columna TOTAL")
+    args = parser.parse_args(argv)
+    
+    salida = args.salida or Path(__file__).parent / 'datos' / f"{args.filas}{'_mensual' if args.mensual else ''}.xlsx"
+    print(generar_exportacion(args.filas, salida, args.semilla, args.mensual))
+
+if __name__ == '__main__':
+    main()
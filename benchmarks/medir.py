@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Benchmark del análisis de stock: tiempo y pico de memoria (RSS) por etapa.
+
+Cada combinación (aplicación, tamaño) se mide en un proceso nuevo, de modo que
+el pico de RSS de una medición no contamina la siguiente. Los resultados se
+guardan en JSON para comparar versiones o detectar regresiones.
+
+Uso:
+    python benchmarks/medir.py --filas 1000 10000 100000 --apps stock6 stock7
+    python benchmarks/medir.py --filas 10000 --comparar benchmarks/resultados/base.json
+"""
+import argparse
+import importlib
+import io
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+from gestion_stock.instrumentacion import rss_pico_mb  # noqa: E402
+
+DATOS = Path(__file__).parent / 'datos'
+RESULTADOS = Path(__file__).parent / 'resultados'
+
+# Una etapa es más lenta que la referencia si tarda más de este factor
+TOLERANCIA_REGRESION = 1.2
+
+
+def texto_mb(valor):
+    return f"{valor:8.1f} MB" if valor is not None else "     -   "
+
+class Cronometro:
+    """Acumula {etapa: {'segundos', 'rss_pico_mb'}} en el orden de ejecución"""
+    
+    def __init__(self):
+        self.etapas = {}
+    
+    def medir(self, etapa, funcion, *args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = funcion(*args, **kwargs)
+        self.etapas[etapa] = {'segundos': time.perf_counter() - inicio, 'rss_pico_mb': rss_pico_mb()}
+        return resultado
+
+class ArchivoSubido(io.BytesIO):
+    """Sustituto mínimo del UploadedFile de Streamlit"""
+    
+    def __init__(self, contenido, nombre):
+        super().__init__(contenido)
+        self.name = nombre
+
+def medir_stock7(contenido, nombre, parametros):
+    crono = Cronometro()
+    stock7 = crono.medir('importacion', importlib.import_module, 'stock7')
+    from gestion_stock import ingerir_excel
+    
+    df_base, cols = crono.medir('ingesta', ingerir_excel, contenido)
+    # La lectura del Excel se mide dentro de la ingesta (df.attrs['lectura'])
+    lectura = df_base.attrs['lectura']['segundos']
+    crono.etapas['ingesta']['segundos'] -= lectura
+    crono.etapas = {'importacion': crono.etapas['importacion'],
+                    'lectura': {'segundos': lectura, 'rss_pico_mb': crono.etapas['ingesta']['rss_pico_mb']},
+                    'ingesta': crono.etapas['ingesta']}
+    
+    df = crono.medir('niveles', stock7.calcular_niveles, df_base, cols, parametros['dias_abierto'],
+                     parametros['stock_min_dias'], parametros['dias_cobertura'], parametros['margen_seguridad'])
+    cubo = crono.medir('cubo', stock7.construir_cubo, df, cols)
+    df.attrs['huella'] = 'benchmark'
+    
+    # Secciones de la página (en modo 'bare' Streamlit no dibuja, pero se construyen
+    # tablas, figuras y archivos de descarga igual que en la aplicación)
+    stock7.st.session_state['mostrar_cns_sobrante'] = True
+    crono.medir('mostrar_resumen_ejecutivo', stock7.mostrar_resumen_ejecutivo, cubo)
+    crono.medir('grafico_distribucion_categorias', stock7.grafico_distribucion_categorias, df, cols, cubo)
+    crono.medir('grafico_comparativa_stock', stock7.grafico_comparativa_stock, cubo, cols)
+    crono.medir('analisis_familias', stock7.analisis_familias, cubo, cols)
+    crono.medir('botones_exportacion', stock7.botones_exportacion, df, cols, cubo)
+    
+    # Las descargas se generan al pedirlas: se mide su coste aparte
+    crono.medir('exportar_analisis_completo', stock7.exportar_analisis_completo, df, cubo)
+    crono.medir('exportar_cns', stock7.exportar_cns, df, cols)
+    return crono.etapas, len(df)
+
+def medir_stock6(contenido, nombre, parametros):
+    crono = Cronometro()
+    stock6 = crono.medir('importacion', importlib.import_module, 'stock6')
+    
+    # Sin caché de Streamlit: se mide el cálculo, no un acierto de caché
+    procesar = getattr(stock6.procesar_excel, '__wrapped__', stock6.procesar_excel)
+    resultado = crono.medir('procesar_excel', procesar, ArchivoSubido(contenido, nombre),
+                            parametros['dias_abierto'], parametros['stock_min_dias'],
+                            parametros['stock_max_dias'], parametros['dias_cobertura'],
+                            parametros['margen_seguridad'])
+    return crono.etapas, len(resultado[0])
+
+APLICACIONES = {'stock6': medir_stock6, 'stock7': medir_stock7}
+PARAMETROS = {'dias_abierto': 300, 'stock_min_dias': 10, 'stock_max_dias': 20,
+              'dias_cobertura': 15, 'margen_seguridad': 0.1}
+
+def medir_en_proceso(app, ruta):
+    """Mide una aplicación sobre un archivo en este proceso e imprime el resultado en JSON"""
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.WARNING)  # avisos de Streamlit en modo 'bare'
+    
+    contenido = Path(ruta).read_bytes()
+    rss_inicial = rss_pico_mb()
+    inicio = time.perf_counter()
+    etapas, filas = APLICACIONES[app](contenido, Path(ruta).name, PARAMETROS)
+    print(json.dumps({
+        'app': app,
+        'archivo': Path(ruta).name,
+        'filas': filas,
+        'segundos': time.perf_counter() - inicio,
+        'rss_inicial_mb': rss_inicial,
+        'rss_pico_mb': rss_pico_mb(),
+        'etapas': etapas,
+    }))
+
+def asegurar_archivo(filas, mensual):
+    """Ruta del libro sintético de 'filas' productos, generándolo si no existe"""
+    from generar_exportacion import generar_exportacion
+    
+    ruta = DATOS / f"{filas}{'_mensual' if mensual else ''}.xlsx"
+    if not ruta.exists():
+        print(f"Generando {ruta}...", file=sys.stderr)
+        generar_exportacion(filas, ruta, mensual=mensual)
+    return ruta
+
+def comparar(resultados, referencia):
+    """Compara con una ejecución anterior e imprime las etapas más lentas que la tolerancia"""
+    base = {(r['app'], r['filas']): r for r in referencia['resultados']}
+    regresiones = 0
+    for r in resultados:
+        anterior = base.get((r['app'], r['filas']))
+        if anterior is None:
+            continue
+        for etapa, medida in r['etapas'].items():
+            previo = anterior['etapas'].get(etapa)
+            if previo and previo['segundos'] > 0.01 and medida['segundos'] > previo['segundos'] * TOLERANCIA_REGRESION:
+                regresiones += 1
+                print(f"⚠️ {r['app']} {r['filas']} filas, {etapa}: "
+                      f"{previo['segundos']:.3f} s -> {medida['segundos']:.3f} s")
+    return regresiones
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark por etapas de las aplicaciones de stock")
+    parser.add_argument('--filas', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--apps', nargs='+', choices=list(APLICACIONES), default=['stock7'])
+    parser.add_argument('--mensual', action='store_true', help="Ventas mensuales en lugar de TOTAL")
+    parser.add_argument('--repeticiones', type=int, default=1, help="Se conserva la más rápida")
+    parser.add_argument('-o', '--salida', help="JSON de resultados (por defecto: benchmarks/resultados/<fecha>.json)")
+    parser.add_argument('--comparar', help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument('--medir', nargs=2, metavar=('APP', 'ARCHIVO'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.medir:
+        medir_en_proceso(*args.medir)
+        return 0
+    
+    resultados = []
+    for filas in args.filas:
+        ruta = asegurar_archivo(filas, args.mensual)
+        for app in args.apps:
+            mediciones = []
+            for _ in range(args.repeticiones):
+                salida = subprocess.run([sys.executable, __file__, '--medir', app, str(ruta)],
+                                        capture_output=True, text=True, check=True)
+                mediciones.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+            mejor = min(mediciones, key=lambda m: m['segundos'])
+            resultados.append(mejor)
+            print(f"{app:8} {filas:>9} filas  {mejor['segundos']:8.2f} s  pico {texto_mb(mejor['rss_pico_mb'])}")
+            for etapa, medida in mejor['etapas'].items():
+                print(f"    {etapa:34} {medida['segundos']:8.3f} s  {texto_mb(medida['rss_pico_mb'])}")
+    
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'parametros': PARAMETROS,
+        'resultados': resultados,
+    }
+    salida = Path(args.salida) if args.salida else RESULTADOS / f"{datetime.now():%Y%m%d_%H%M%S}.json"
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"Resultados: {salida}")
+    
+    if args.comparar:
+        referencia = json.loads(Path(args.comparar).read_text(encoding='utf-8'))
+        return 1 if comparar(resultados, referencia) else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Núcleo de cálculo del análisis de stock, sin dependencia de Streamlit.
+
+Las aplicaciones stock*.py son vistas sobre estas funciones:
+
+    from gestion_stock import Parametros, analizar_excel
+    analisis = analizar_excel(open('ventas.xlsx', 'rb').read(), Parametros(dias_cobertura=20))
+    analisis.cubo  # agregados por Categoria × Familia × Subfamilia
+"""
+from .agregacion import (DIMENSIONES_CUBO, MEDIDAS_CUBO, agregar_cubo, construir_cubo,
+                         hojas_resumen, resumen_categorias)
+from .analisis import Analisis, analizar_excel, analizar_ingesta
+from .busqueda import IndiceBusqueda, normalizar_textos
+from .cache import CacheIngesta, CacheLRU, huella, huella_contenido
+from .clasificacion import (TRIE_FAMILIAS, TrieFamilias, categorizar_productos, extraer_familia,
+                            extraer_familias, prefijo_categoria)
+from .comparacion import (MEDIDAS_DIFERENCIA, comparar_analisis, migraciones_categoria,
+                          resumen_diferencias)
+from .configuracion import (CATEGORIAS, FAMILIAS_MAP, NIVELES_STOCK, POLITICAS_STOCK,
+                            TIPO_PEDIDO_DEFECTO, UMBRALES_CATEGORIA, VERSION_PARSER, Regla,
+                            por_dias, por_unidades)
+from .detalle import FILAS_POR_PAGINA, columnas_detalle, filas_filtradas, ordenar_filas, pagina_detalle
+from .exportacion import (exportar_analisis_completo, exportar_cns, exportar_comparativa,
+                          productos_con_exceso)
+from .filtros import IndiceFiltros
+from .formato import formatear_euros, formatear_numeros, formato_euros, formato_numero
+from .historico import AlmacenSnapshots, nombre_particion
+from .instrumentacion import Registro, etapa, medido, registrar, rss_pico_mb
+from .ingesta import calcular_ventas_totales, compactar_tipos, ingerir_excel
+from .lectura import LECTORES_EXCEL, detectar_columnas, detectar_formato, leer_excel, motores_disponibles
+from .multitienda import aplanar_columnas, combinar_tiendas, ingerir_varios
+from .niveles import (COLUMNAS_NIVELES, calcular_niveles, calcular_stocks_por_categoria,
+                      matriz_politica, redondear)
+from .seleccion import filas_mayores, mayores, posiciones_mayores
+from .tipos import Columnas, InformeLectura, InformeMemoria, Parametros
+
+__all__ = [
+    'DIMENSIONES_CUBO', 'MEDIDAS_CUBO', 'agregar_cubo', 'construir_cubo', 'hojas_resumen',
+    'resumen_categorias',
+    'Analisis', 'analizar_excel', 'analizar_ingesta',
+    'IndiceBusqueda', 'normalizar_textos',
+    'CacheIngesta', 'CacheLRU', 'huella', 'huella_contenido',
+    'TRIE_FAMILIAS', 'TrieFamilias', 'categorizar_productos', 'extraer_familia',
+    'extraer_familias', 'prefijo_categoria',
+    'MEDIDAS_DIFERENCIA', 'comparar_analisis', 'migraciones_categoria', 'resumen_diferencias',
+    'CATEGORIAS', 'FAMILIAS_MAP', 'NIVELES_STOCK', 'POLITICAS_STOCK', 'TIPO_PEDIDO_DEFECTO',
+    'UMBRALES_CATEGORIA', 'VERSION_PARSER', 'Regla', 'por_dias', 'por_unidades',
+    'FILAS_POR_PAGINA', 'columnas_detalle', 'filas_filtradas', 'ordenar_filas',
+    'pagina_detalle',
+    'exportar_analisis_completo', 'exportar_cns', 'exportar_comparativa',
+    'productos_con_exceso',
+    'IndiceFiltros',
+    'formatear_euros', 'formatear_numeros', 'formato_euros', 'formato_numero',
+    'AlmacenSnapshots', 'nombre_particion',
+    'Registro', 'etapa', 'medido', 'registrar', 'rss_pico_mb',
+    'calcular_ventas_totales', 'compactar_tipos', 'ingerir_excel',
+    'LECTORES_EXCEL', 'detectar_columnas', 'detectar_formato', 'leer_excel',
+    'motores_disponibles',
+    'aplanar_columnas', 'combinar_tiendas', 'ingerir_varios',
+    'COLUMNAS_NIVELES', 'calcular_niveles', 'calcular_stocks_por_categoria', 'matriz_politica',
+    'redondear',
+    'filas_mayores', 'mayores', 'posiciones_mayores',
+    'Columnas', 'InformeLectura', 'InformeMemoria', 'Parametros',
+]
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Cubo de agregación por Categoria × Familia × Subfamilia y sus roll-ups."""
+import numpy as np
+import pandas as pd
+
+from .configuracion import CATEGORIAS
+from .instrumentacion import medido
+from .tipos import Columnas
+
+
+# Medidas aditivas del cubo -> columna de origen del DataFrame procesado
+MEDIDAS_CUBO = {
+    'Stock_Ideal': 'Stock_Ideal',
+    'Stock_Limite': 'Stock_Limite',
+    'Stock_Sobrante_Uds': 'Stock_Sobrante_Uds',
+    'Stock_Faltante_Uds': 'Stock_Faltante_Uds',
+    'Valor_Stock_Actual': 'Valor_Stock_Actual',
+    'Valor_Stock_Ideal': 'Valor_Stock_Ideal',
+    'Valor_Stock_Limite': 'Valor_Stock_Limite',
+    'Stock_Sobrante': 'Stock_Sobrante',
+    'Stock_Faltante': 'Stock_Faltante',
+    'Total_Ventas': 'Total_Ventas',
+    'Valor_Ventas': 'Valor_Ventas',
+    'Suma_IR': 'Indice_Rotacion',
+}
+DIMENSIONES_CUBO = ['Categoria', 'Familia', 'Subfamilia']
+
+@medido(nombre='cubo')
+def construir_cubo(df: pd.DataFrame, cols: Columnas) -> pd.DataFrame:
+    """Agrega en una sola pasada todas las medidas aditivas por Categoria × Familia × Subfamilia.
+    
+    Todas las tablas y gráficos se obtienen de este cubo con agregar_cubo, así
+    que el coste por ejecución no depende del número de secciones de la página.
+    """
+    medidas = {
+        'Filas': np.ones(len(df), dtype=np.int64),
+        'Refs': (df[cols['cn']].notna() if cols['cn'] else pd.Series(True, index=df.index)).astype(np.int64),
+    }
+    if cols['stock_actual']:
+        medidas['Stock_Actual'] = df[cols['stock_actual']]
+    for medida, columna in MEDIDAS_CUBO.items():
+        if columna in df.columns:
+            medidas[medida] = df[columna]
+    
+    claves = [df[dim] for dim in DIMENSIONES_CUBO]
+    return pd.DataFrame(medidas, index=df.index).groupby(claves, observed=True, dropna=False).sum()
+
+def agregar_cubo(cubo: pd.DataFrame, nivel=None) -> pd.DataFrame:
+    """Roll-up del cubo a una o varias dimensiones (None = total general).
+    
+    Añade 'IR_Medio', la media del índice de rotación por fila.
+    """
+    if nivel is None:
+        agregado = cubo.sum().to_frame().T
+    else:
+        agregado = cubo.groupby(level=nivel, observed=True, dropna=False).sum()
+    if 'Suma_IR' in agregado.columns:
+        agregado['IR_Medio'] = agregado['Suma_IR'] / agregado['Filas'].replace(0, np.nan)
+    return agregado
+
+def resumen_categorias(cubo: pd.DataFrame) -> pd.DataFrame:
+    """Roll-up por categoría con todas las categorías A-E, aunque estén vacías"""
+    return agregar_cubo(cubo, 'Categoria').reindex(CATEGORIAS, fill_value=0)
+
+def hojas_resumen(cubo: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Hojas 'Resumen Categorías' y 'Resumen Familias' del informe, derivadas del cubo"""
+    columnas_cat = ['Refs', 'Stock_Actual', 'Stock_Ideal', 'Stock_Sobrante', 'Stock_Faltante',
+                    'Valor_Stock_Actual', 'Total_Ventas']
+    columnas_fam = ['Refs', 'Stock_Actual', 'Stock_Ideal', 'Stock_Limite', 'Stock_Sobrante',
+                    'Stock_Faltante', 'Valor_Stock_Actual', 'Total_Ventas']
+    
+    por_categoria = agregar_cubo(cubo, 'Categoria')
+    por_familia = agregar_cubo(cubo, 'Familia')
+    return {
+        'Resumen Categorías': por_categoria[[c for c in columnas_cat if c in por_categoria]].round(2),
+        'Resumen Familias': por_familia[[c for c in columnas_fam if c in por_familia]].round(2),
+    }
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Análisis completo de un Excel: ingesta, niveles y cubo en una sola llamada."""
+from dataclasses import dataclass
+
+import pandas as pd
+
+from .agregacion import construir_cubo
+from .ingesta import ingerir_excel
+from .niveles import calcular_niveles
+from .tipos import Columnas, Parametros
+
+
+@dataclass
+class Analisis:
+    """Resultado del análisis: DataFrame por producto, columnas detectadas y cubo"""
+    df: pd.DataFrame
+    cols: Columnas
+    cubo: pd.DataFrame
+
+
+def analizar_ingesta(df_base: pd.DataFrame, cols: Columnas, parametros: Parametros) -> Analisis:
+    """Etapa 2 sobre un DataFrame ya ingerido (por ejemplo, sacado de una caché)"""
+    df = calcular_niveles(df_base, cols, parametros.dias_abierto, parametros.stock_min_dias,
+                          parametros.dias_cobertura, parametros.margen_seguridad, parametros.tipo_pedido)
+    return Analisis(df=df, cols=cols, cubo=construir_cubo(df, cols))
+
+def analizar_excel(contenido: bytes, parametros: Parametros = Parametros()) -> Analisis:
+    """Lee el Excel y calcula niveles y agregados con los parámetros dados"""
+    df_base, cols = ingerir_excel(contenido)
+    return analizar_ingesta(df_base, cols, parametros)
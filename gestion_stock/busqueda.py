@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Búsqueda de productos por CN (prefijo) y por descripción (trigramas sin acentos)."""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .instrumentacion import medido
+from .multitienda import clave_cn
+
+# Alfabeto de los trigramas tras normalizar: espacio, a-z y 0-9
+ALFABETO = " abcdefghijklmnopqrstuvwxyz0123456789"
+_CODIGO_CARACTER = np.zeros(256, dtype=np.int64)
+_CODIGO_CARACTER[np.frombuffer(ALFABETO.encode('ascii'), dtype=np.uint8)] = np.arange(len(ALFABETO))
+_K = len(ALFABETO)
+
+# Fracción mínima de trigramas de la consulta que debe tener una descripción
+SIMILITUD_MINIMA = 0.5
+RESULTADOS_POR_DEFECTO = 20
+
+
+def normalizar_textos(textos) -> pa.Array:
+    """Minúsculas, sin acentos (ñ -> n) y solo letras y cifras separadas por un espacio"""
+    texto = pa.array(pd.Series(textos, copy=False).astype('string[pyarrow]').array)
+    texto = pc.utf8_normalize(pc.fill_null(texto, ""), "NFKD")
+    texto = pc.utf8_lower(pc.replace_substring_regex(texto, r"\p{Mn}", ""))
+    return pc.utf8_trim_whitespace(pc.replace_substring_regex(texto, r"[^a-z0-9]+", " "))
+
+def expandir_rangos(inicios: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Concatena los rangos [inicio, inicio + longitud) sin bucle de Python"""
+    total = int(longitudes.sum())
+    desplazamiento = np.repeat(inicios - (np.cumsum(longitudes) - longitudes), longitudes)
+    return desplazamiento + np.arange(total)
+
+def trigramas(textos: pa.Array) -> tuple[np.ndarray, np.ndarray]:
+    """(trigrama, texto) de todos los trigramas de textos normalizados, con un espacio a cada lado.
+    
+    Se calcula sobre el buffer de Arrow de una vez: cada trigrama es un entero
+    c0·K² + c1·K + c2 con los códigos de ALFABETO.
+    """
+    # string (desplazamientos de 32 bits), no large_string como en pandas
+    relleno = pc.binary_join_element_wise(" ", textos.cast(pa.string()), " ", "")
+    if isinstance(relleno, pa.ChunkedArray):
+        relleno = relleno.combine_chunks()
+    desplazamientos = np.frombuffer(relleno.buffers()[1], dtype=np.int32)
+    desplazamientos = desplazamientos[relleno.offset:relleno.offset + len(relleno) + 1]
+    datos = np.frombuffer(relleno.buffers()[2], dtype=np.uint8)
+    codigos = _CODIGO_CARACTER[datos[desplazamientos[0]:desplazamientos[-1]]]
+    desplazamientos = desplazamientos - desplazamientos[0]
+    
+    longitudes = np.diff(desplazamientos)
+    n_trigramas = np.maximum(longitudes - 2, 0)
+    texto = np.repeat(np.arange(len(longitudes)), n_trigramas)
+    posicion = expandir_rangos(desplazamientos[:-1], n_trigramas)
+    trigrama = codigos[posicion] * _K * _K + codigos[posicion + 1] * _K + codigos[posicion + 2]
+    return trigrama, texto
+
+class IndiceBusqueda:
+    """Índice invertido de trigramas de las descripciones y CN ordenados para buscar por prefijo.
+    
+    Se construye una vez por conjunto de datos; las posiciones devueltas son
+    filas (iloc) de las series con las que se creó. Las descripciones repetidas
+    (p. ej. el mismo producto en varias farmacias) se indexan una sola vez.
+    """
+    
+    @medido(nombre='indice_busqueda')
+    def __init__(self, cn: pd.Series | None, descripcion: pd.Series | None):
+        self.filas = len(cn) if cn is not None else len(descripcion)
+        if self.filas == 0:
+            # Excel solo con cabecera: índice vacío, buscar no devuelve ninguna fila
+            cn = descripcion = None
+        
+        # CN como texto ordenado: un prefijo es un rango contiguo (searchsorted)
+        if cn is not None:
+            texto_cn = clave_cn(cn).fillna("").to_numpy(dtype=str)
+            self._cn_de_fila = texto_cn
+            self._orden_cn = np.argsort(texto_cn, kind='stable')
+            self._cns = texto_cn[self._orden_cn]
+        else:
+            self._cn_de_fila = self._cns = np.empty(0, dtype=str)
+            self._orden_cn = np.empty(0, dtype=np.int64)
+        
+        # Trigramas de las descripciones distintas, en formato CSR: trigrama -> textos
+        if descripcion is not None:
+            normalizadas = normalizar_textos(descripcion)
+            codigo, unicas = pd.factorize(pd.Series(pd.arrays.ArrowStringArray(normalizadas)))
+            self._texto_de_fila = codigo
+            self._textos = pa.array(unicas.array)
+            self._longitudes = pc.utf8_length(self._textos).to_numpy()
+            trigrama, texto = trigramas(self._textos)
+            # Pares (trigrama, texto) sin repetir; ordenar y quitar contiguos es mucho más
+            # rápido que np.unique (por tabla hash) con millones de enteros
+            pares = np.sort(trigrama * len(unicas) + texto)
+            nuevos = np.ones(len(pares), dtype=bool)
+            nuevos[1:] = pares[1:] != pares[:-1]
+            pares = pares[nuevos]
+            self._postings = (pares % len(unicas)).astype(np.int32)
+            self._inicio = np.searchsorted(pares // len(unicas), np.arange(_K ** 3 + 1))
+            # Filas de cada texto, agrupadas (CSR)
+            self._filas_por_texto = np.argsort(codigo, kind='stable')
+            self._inicio_filas = np.searchsorted(codigo[self._filas_por_texto], np.arange(len(unicas) + 1))
+        else:
+            self._texto_de_fila = None
+    
+    def memoria(self) -> int:
+        """Bytes ocupados por las estructuras del índice (para la caché)"""
+        arrays = [v for v in vars(self).values() if isinstance(v, np.ndarray)]
+        return sum(a.nbytes for a in arrays) + (self._textos.nbytes if self._texto_de_fila is not None else 0)
+    
+    def por_cn(self, prefijo: str) -> np.ndarray:
+        """Filas cuyo CN empieza por el prefijo, de CN más corto a más largo"""
+        desde = np.searchsorted(self._cns, prefijo, side='left')
+        hasta = np.searchsorted(self._cns, prefijo + "\uffff", side='left')
+        filas = self._orden_cn[desde:hasta]
+        return filas[np.argsort(np.char.str_len(self._cns[desde:hasta]), kind='stable')]
+    
+    def por_descripcion(self, consulta: str) -> tuple[np.ndarray, np.ndarray]:
+        """(filas, similitud) de las descripciones con al menos SIMILITUD_MINIMA de los trigramas"""
+        if self._texto_de_fila is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        normalizada = normalizar_textos([consulta])
+        buscados = np.unique(trigramas(normalizada)[0])
+        if len(buscados) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        
+        listas = [self._postings[self._inicio[t]:self._inicio[t + 1]] for t in buscados]
+        aciertos = np.bincount(np.concatenate(listas), minlength=len(self._textos))
+        similitud = aciertos / len(buscados)
+        textos = np.flatnonzero(similitud >= SIMILITUD_MINIMA)
+        # La consulta completa dentro del texto desempata a favor de la coincidencia literal
+        literal = pc.match_substring(self._textos.take(textos), normalizada[0].as_py())
+        puntuacion = similitud[textos] + 0.5 * literal.to_numpy(zero_copy_only=False)
+        
+        longitudes = self._inicio_filas[textos + 1] - self._inicio_filas[textos]
+        filas = self._filas_por_texto[expandir_rangos(self._inicio_filas[textos], longitudes)]
+        return filas, np.repeat(puntuacion, longitudes)
+    
+    def buscar(self, consulta: str, limite: int = RESULTADOS_POR_DEFECTO) -> tuple[np.ndarray, np.ndarray]:
+        """Las mejores filas para la consulta y su puntuación, de mayor a menor.
+        
+        Un CN que empieza por la consulta puntúa 2 (3 si es exacto); una
+        descripción, la fracción de trigramas compartidos (+0,5 si contiene la
+        consulta entera). Solo se ordenan los candidatos, no el catálogo.
+        """
+        consulta = consulta.strip()
+        if not consulta:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        
+        filas, puntuaciones = [], []
+        if consulta.isdigit():
+            por_cn = self.por_cn(consulta)[:limite]
+            filas.append(por_cn)
+            puntuaciones.append(2.0 + (self._cn_de_fila[por_cn] == consulta))
+        if len(consulta) >= 2:
+            por_descripcion, similitud = self.por_descripcion(consulta)
+            filas.append(por_descripcion)
+            puntuaciones.append(similitud)
+        if not filas:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        
+        filas, puntuaciones = np.concatenate(filas), np.concatenate(puntuaciones)
+        # Sin repetir filas: la mejor puntuación de cada una
+        orden = np.argsort(-puntuaciones, kind='stable')
+        filas, primera = np.unique(filas[orden], return_index=True)
+        puntuaciones = puntuaciones[orden][primera]
+        # Empates: primero la descripción más corta (más parecida a la consulta) y luego la fila
+        longitud = (self._longitudes[self._texto_de_fila[filas]] if self._texto_de_fila is not None
+                    else np.zeros(len(filas)))
+        orden = np.lexsort((filas, longitud, -puntuaciones))[:limite]
+        return filas[orden], puntuaciones[orden]
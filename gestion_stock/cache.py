@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Caché LRU en memoria de archivos ingeridos, independiente de la interfaz."""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .configuracion import VERSION_PARSER
+
+
+class CacheLRU:
+    """Caché LRU con límite de entradas, TTL y memoria.
+    
+    Es segura entre hilos porque Streamlit atiende cada sesión en un hilo distinto.
+    """
+    
+    def __init__(self, max_entradas: int, ttl_segundos: float, memoria_mb: float):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.memoria_max = memoria_mb * 1024 * 1024
+        self._entradas = OrderedDict()  # clave -> (valor, bytes, instante)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+    
+    @property
+    def memoria_usada(self) -> int:
+        return sum(tam for _, tam, _ in self._entradas.values())
+    
+    def obtener(self, clave: str):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and time.monotonic() - entrada[2] > self.ttl_segundos:
+                del self._entradas[clave]
+                self.expulsiones += 1
+                entrada = None
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[0]
+    
+    def guardar(self, clave: str, valor, tam_bytes: int):
+        with self._lock:
+            if clave in self._entradas:
+                del self._entradas[clave]
+            self._entradas[clave] = (valor, tam_bytes, time.monotonic())
+            self._expulsar()
+    
+    def _expulsar(self):
+        ahora = time.monotonic()
+        for clave in [c for c, (_, _, t) in self._entradas.items() if ahora - t > self.ttl_segundos]:
+            del self._entradas[clave]
+            self.expulsiones += 1
+        # La entrada recién guardada se conserva aunque supere el presupuesto por sí sola
+        while len(self._entradas) > 1 and (len(self._entradas) > self.max_entradas
+                                           or self.memoria_usada > self.memoria_max):
+            self._entradas.popitem(last=False)
+            self.expulsiones += 1
+    
+    def limpiar(self):
+        with self._lock:
+            self.expulsiones += len(self._entradas)
+            self._entradas.clear()
+    
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'memoria_mb': self.memoria_usada / (1024 * 1024),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'expulsiones': self.expulsiones,
+            }
+
+class CacheIngesta(CacheLRU):
+    """Caché de archivos ingeridos.
+    
+    Las claves son hashes del contenido del archivo, de modo que el mismo Excel
+    subido por varios usuarios se procesa una sola vez.
+    """
+    
+    @staticmethod
+    def clave(contenido: bytes) -> str:
+        """Hash del contenido del archivo más la versión del parser"""
+        h = hashlib.sha256(contenido)
+        h.update(f"parser-v{VERSION_PARSER}".encode())
+        return h.hexdigest()
+
+def huella(*partes) -> str:
+    """Hash de claves y parámetros para cachear resultados derivados (p. ej. exportaciones)"""
+    return hashlib.sha256(repr(partes).encode()).hexdigest()
+
+def huella_contenido(*partes) -> str:
+    """Como huella, pero con el contenido completo de Series, DataFrames y arrays.
+    
+    repr trunca los objetos grandes; aquí se hashean sus valores, índice y tipos.
+    """
+    h = hashlib.sha256()
+    for parte in partes:
+        if isinstance(parte, (pd.Series, pd.DataFrame)):
+            h.update(pd.util.hash_pandas_object(parte, index=True).to_numpy().tobytes())
+            tipos = parte.dtypes.to_dict() if isinstance(parte, pd.DataFrame) else {parte.name: parte.dtype}
+            h.update(repr((parte.index.names, list(tipos.items()))).encode())
+        elif isinstance(parte, np.ndarray):
+            h.update(repr((parte.dtype.str, parte.shape)).encode())
+            h.update(np.ascontiguousarray(parte).tobytes())
+        else:
+            h.update(repr(parte).encode())
+        h.update(b"\x00")
+    return h.hexdigest()
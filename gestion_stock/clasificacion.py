@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Clasificación de productos: familias funcionales y categorías de rotación A-E."""
+import numpy as np
+import pandas as pd
+
+from .configuracion import CATEGORIAS, FAMILIAS_MAP, UMBRALES_CATEGORIA
+from .instrumentacion import medido
+
+
+class TrieFamilias:
+    """Trie de prefijos de FAMILIAS_MAP para resolver familias sin depender del orden del mapa.
+    
+    Gana el prefijo más largo contenido en la categoría ('ESPECSR' antes que 'ESPEC',
+    'DIETSOE' antes que 'DIET'). Si ningún prefijo encaja pero la categoría es el
+    inicio de prefijos de una sola familia ('DERM' -> DERMO) se usa esa familia.
+    """
+    FIN = None  # clave del nodo que guarda la familia
+    
+    def __init__(self, mapa: dict[str, str]):
+        self.raiz = {}
+        for prefijo, familia in mapa.items():
+            nodo = self.raiz
+            for letra in prefijo.upper():
+                nodo = nodo.setdefault(letra, {})
+            nodo[self.FIN] = familia
+    
+    def _familias_bajo(self, nodo):
+        familias = set()
+        pendientes = [nodo]
+        while pendientes:
+            actual = pendientes.pop()
+            for letra, hijo in actual.items():
+                if letra is self.FIN:
+                    familias.add(hijo)
+                else:
+                    pendientes.append(hijo)
+        return familias
+    
+    def resolver(self, prefijo: str) -> str:
+        nodo = self.raiz
+        mejor = None
+        for letra in prefijo:
+            nodo = nodo.get(letra)
+            if nodo is None:
+                return mejor or 'OTROS'
+            mejor = nodo.get(self.FIN, mejor)
+        if mejor is not None:
+            return mejor
+        familias = self._familias_bajo(nodo) if prefijo else set()
+        return familias.pop() if len(familias) == 1 else 'OTROS'
+
+TRIE_FAMILIAS = TrieFamilias(FAMILIAS_MAP)
+
+def prefijo_categoria(categoria_str) -> str:
+    """Prefijo de la categoría antes del guión ('DERMO-ACNE' -> 'DERMO')"""
+    return str(categoria_str).split('-')[0].strip().upper()
+
+def extraer_familia(categoria_str) -> str:
+    if pd.isna(categoria_str):
+        return 'SIN CLASIFICAR'
+    return TRIE_FAMILIAS.resolver(prefijo_categoria(categoria_str))
+
+@medido(nombre='familias')
+def extraer_familias(categorias: pd.Series) -> pd.Series:
+    """Familia de cada fila resolviendo una sola vez cada categoría distinta"""
+    codigos, unicas = pd.factorize(categorias)
+    familias = np.array([TRIE_FAMILIAS.resolver(prefijo_categoria(c)) for c in unicas]
+                        + ['SIN CLASIFICAR'], dtype=object)
+    # Los nulos tienen código -1, que selecciona el 'SIN CLASIFICAR' final
+    return pd.Series(familias[codigos], index=categorias.index)
+
+@medido(nombre='categorias')
+def categorizar_productos(ventas_anuales, umbrales=UMBRALES_CATEGORIA) -> pd.Categorical:
+    """Clasifica todas las ventas anuales de una vez (A-E) buscando en los límites de los tramos.
+    
+    Devuelve un Categorical ordenado; los valores no numéricos van a la última categoría.
+    """
+    ventas = np.asarray(ventas_anuales, dtype=float)
+    categorias = [cat for cat, _, _ in umbrales] + [CATEGORIAS[-1]]
+    
+    # Límites ascendentes; un mínimo excluido (> 260) equivale a incluir el siguiente float
+    limites = np.array([minimo if incluido else np.nextafter(minimo, np.inf)
+                        for _, minimo, incluido in reversed(umbrales)], dtype=float)
+    tramos = np.searchsorted(limites, ventas, side='right')
+    codigos = np.where(np.isnan(ventas), len(umbrales), len(umbrales) - tramos)
+    
+    return pd.Categorical.from_codes(codigos, categories=categorias, ordered=True)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Comparación por CN de dos análisis de una farmacia (p. ej. el mes pasado y hoy)."""
+import numpy as np
+import pandas as pd
+
+from .configuracion import CATEGORIAS
+from .instrumentacion import medido
+from .multitienda import clave_cn
+from .tipos import Columnas
+
+# Medidas comparadas: nombre -> columna del análisis (None: stock actual detectado en el Excel)
+MEDIDAS_DIFERENCIA = {'Stock': None, 'Stock_Sobrante': 'Stock_Sobrante', 'Stock_Faltante': 'Stock_Faltante'}
+ESTADOS_CN = ['Nuevo', 'Retirado', 'Continúa']
+ATRIBUTOS_CN = ['Descripcion', 'Familia', 'Subfamilia']
+
+
+def codificar_cns(cn_anterior: pd.Series, cn_actual: pd.Series) -> tuple[np.ndarray, np.ndarray, pd.Index]:
+    """Códigos enteros 0..n-1 de los CN de ambos análisis sobre un mismo diccionario.
+    
+    Una sola factorización (tabla hash) de los dos lados; los CN vacíos quedan como -1.
+    Si los dos son numéricos se comparan como enteros y, si no, como texto (clave_cn).
+    """
+    if pd.api.types.is_numeric_dtype(cn_anterior) and pd.api.types.is_numeric_dtype(cn_actual):
+        claves = [serie.round().astype('Int64') for serie in (cn_anterior, cn_actual)]
+    else:
+        claves = [clave_cn(serie) for serie in (cn_anterior, cn_actual)]
+    codigos, unicos = pd.factorize(pd.concat(claves, ignore_index=True))
+    return codigos[:len(cn_anterior)], codigos[len(cn_anterior):], pd.Index(unicos, name='CN')
+
+def primera_fila(codigos: np.ndarray, n: int) -> np.ndarray:
+    """Posición de la primera fila de cada código (-1 si el CN no está en el análisis)"""
+    filas = np.full(n, -1, dtype=np.int64)
+    unicos, posiciones = np.unique(codigos, return_index=True)
+    validos = unicos >= 0
+    filas[unicos[validos]] = posiciones[validos]
+    return filas
+
+def sumar_por_cn(codigos: np.ndarray, valores: pd.Series, n: int) -> np.ndarray:
+    """Suma de la medida por código de CN (los CN repetidos en el Excel se acumulan)"""
+    validos = codigos >= 0
+    pesos = valores.to_numpy(dtype=np.float64, na_value=0.0)[validos]
+    return np.bincount(codigos[validos], weights=pesos, minlength=n)
+
+def valores_por_cn(serie: pd.Series, filas: np.ndarray) -> np.ndarray:
+    """Valor de la columna en la primera fila de cada CN (None si no está)"""
+    valores = np.full(len(filas), None, dtype=object)
+    presentes = filas >= 0
+    valores[presentes] = serie.take(filas[presentes]).to_numpy(dtype=object)
+    return valores
+
+def categorias_por_cn(serie: pd.Series, filas: np.ndarray) -> pd.Categorical:
+    """Categoría ABCDE de la primera fila de cada CN (nula si no está)"""
+    codigos = np.full(len(filas), -1, dtype=np.int8)
+    presentes = filas >= 0
+    codigos[presentes] = pd.Categorical(serie, categories=CATEGORIAS).codes[filas[presentes]]
+    return pd.Categorical.from_codes(codigos, categories=CATEGORIAS)
+
+@medido(nombre='comparacion')
+def comparar_analisis(anterior: tuple[pd.DataFrame, Columnas],
+                      actual: tuple[pd.DataFrame, Columnas]) -> pd.DataFrame:
+    """Diferencias por CN entre dos análisis (df, cols) ya con niveles.
+    
+    Una fila por CN de cualquiera de los dos, con su Estado (Nuevo, Retirado o
+    Continúa), la categoría antes y ahora, y cada medida de MEDIDAS_DIFERENCIA
+    antes, ahora y su Delta (ahora - antes; un CN ausente cuenta como 0).
+    Descripción, familia y subfamilia se toman del análisis actual si el CN sigue.
+    """
+    (df_ant, cols_ant), (df_act, cols_act) = anterior, actual
+    if not cols_ant['cn'] or not cols_act['cn']:
+        raise ValueError("Para comparar análisis los dos necesitan columna de CN")
+    
+    cod_ant, cod_act, cns = codificar_cns(df_ant[cols_ant['cn']], df_act[cols_act['cn']])
+    n = len(cns)
+    filas_ant, filas_act = primera_fila(cod_ant, n), primera_fila(cod_act, n)
+    en_ant, en_act = filas_ant >= 0, filas_act >= 0
+    
+    estado = np.select([en_act & ~en_ant, en_ant & ~en_act], [0, 1], default=2).astype(np.int8)
+    columnas = {}
+    for nombre in ATRIBUTOS_CN:
+        col_ant, col_act = (cols['descripcion'] if nombre == 'Descripcion' else nombre
+                            for cols in (cols_ant, cols_act))
+        if col_ant in df_ant.columns and col_act in df_act.columns:
+            columnas[nombre] = np.where(en_act, valores_por_cn(df_act[col_act], filas_act),
+                                        valores_por_cn(df_ant[col_ant], filas_ant))
+    columnas['Estado'] = pd.Categorical.from_codes(estado, categories=ESTADOS_CN)
+    
+    cat_ant = categorias_por_cn(df_ant['Categoria'], filas_ant)
+    cat_act = categorias_por_cn(df_act['Categoria'], filas_act)
+    columnas['Categoria'] = pd.Categorical.from_codes(np.where(en_act, cat_act.codes, cat_ant.codes),
+                                                      categories=CATEGORIAS)
+    columnas['Categoria_Anterior'] = cat_ant
+    columnas['Categoria_Actual'] = cat_act
+    columnas['Cambia_Categoria'] = en_ant & en_act & (cat_ant.codes != cat_act.codes)
+    
+    for medida, columna in MEDIDAS_DIFERENCIA.items():
+        col_ant = columna or cols_ant['stock_actual']
+        col_act = columna or cols_act['stock_actual']
+        if col_ant not in df_ant.columns or col_act not in df_act.columns:
+            continue
+        antes = sumar_por_cn(cod_ant, df_ant[col_ant], n)
+        ahora = sumar_por_cn(cod_act, df_act[col_act], n)
+        columnas[f'{medida}_Anterior'] = antes
+        columnas[f'{medida}_Actual'] = ahora
+        columnas[f'Delta_{medida}'] = ahora - antes
+    
+    diferencias = pd.DataFrame(columnas, index=cns)
+    for nombre in ('Familia', 'Subfamilia'):
+        if nombre in diferencias:
+            diferencias[nombre] = diferencias[nombre].astype('category')
+    if 'Descripcion' in diferencias:
+        diferencias['Descripcion'] = diferencias['Descripcion'].astype('string')
+    return diferencias
+
+def migraciones_categoria(diferencias: pd.DataFrame) -> pd.DataFrame:
+    """Matriz categoría anterior × categoría actual con el número de CN que continúan"""
+    k = len(CATEGORIAS)
+    antes = diferencias['Categoria_Anterior'].cat.codes.to_numpy()
+    ahora = diferencias['Categoria_Actual'].cat.codes.to_numpy()
+    validos = (antes >= 0) & (ahora >= 0)
+    matriz = np.bincount(antes[validos].astype(np.int64) * k + ahora[validos], minlength=k * k)
+    return pd.DataFrame(matriz.reshape(k, k), index=pd.Index(CATEGORIAS, name='Antes'),
+                        columns=pd.Index(CATEGORIAS, name='Ahora'))
+
+def resumen_diferencias(diferencias: pd.DataFrame, dimension: str = 'Categoria') -> pd.DataFrame:
+    """Nuevos, retirados, cambios de categoría y suma de cada Delta por Categoria, Familia o Subfamilia"""
+    estado = diferencias['Estado']
+    tabla = pd.DataFrame({
+        'Refs': np.ones(len(diferencias), dtype=np.int64),
+        'Nuevos': estado == 'Nuevo',
+        'Retirados': estado == 'Retirado',
+        'Cambian_Categoria': diferencias['Cambia_Categoria'],
+        **{c: diferencias[c] for c in diferencias.columns if c.startswith('Delta_')},
+    }, index=diferencias.index)
+    return tabla.groupby(diferencias[dimension], observed=True).sum()
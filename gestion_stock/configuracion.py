@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Constantes del análisis: familias, umbrales de rotación y políticas de stock."""
+from collections import namedtuple
+
+# ==================== FAMILIAS ====================
+FAMILIAS_MAP = {
+    'ADELG': 'ADELGAZANTES', 'ANTICEL': 'ANTICELULITICOS', 'AROMA': 'AROMATERAPIA',
+    'DEPORTE': 'DEPORTE', 'DERMO': 'DERMO', 'DIETSOE': 'DIET SOE', 'DIET': 'DIETETICA',
+    'EFECSOE': 'EFEC SOE', 'EFEC': 'EFECTOS', 'EFP': 'EFP', 'ESPEC': 'ESPECIALIDAD',
+    'ESPECSR': 'ESPECIALIDAD', 'FITO': 'FITOTERAPIA', 'HIGBUC': 'HIG.BUCAL',
+    'HIGCAP': 'HIG.CAPILAR', 'HIGCORP': 'HIG.CORPORAL', 'HOMEO': 'HOMEOPATIA',
+    'INFAN': 'INFANTIL', 'INFANSOE': 'INFANTIL SOE', 'INSEC': 'INSECTOS',
+    'NASOI': 'NARIZ OIDOS', 'OPTIC': 'OPTICA', 'ORTO': 'ORTOPEDIA',
+    'ORTOSOE': 'ORTOPEDIA SOE', 'PIEMAN': 'PIES/MANOS', 'GINEC': 'SALUD GINECOLOGICA',
+    'SEX': 'SALUD SEXUAL', 'SOL': 'SOLARES', 'VET': 'VETERINARIA',
+    'VACUNAS': 'VACUNAS', 'FORMULAS': 'FORMULAS', 'ENVASE': 'ENVASE CLINICO'
+}
+
+# ==================== CATEGORÍAS DE ROTACIÓN ====================
+# Clasificación por rotación: (categoría, ventas anuales mínimas, ¿mínimo incluido?),
+# de mayor a menor. Lo que no alcanza ningún umbral es la última categoría.
+UMBRALES_CATEGORIA = [
+    ('A', 260, False),
+    ('B', 52, True),
+    ('C', 12, True),
+    ('D', 1, True),
+]
+CATEGORIAS = [cat for cat, _, _ in UMBRALES_CATEGORIA] + ['E']
+
+# ==================== POLÍTICAS DE STOCK ====================
+# Cada nivel de stock se calcula como (Vtas_Dia × días + unidades) × (1 + margen si procede).
+# 'dias' puede ser un número o el nombre de un parámetro de la barra lateral;
+# 'max_dias' limita los días cuando vienen de un parámetro.
+Regla = namedtuple('Regla', ['dias', 'unidades', 'margen', 'max_dias'], defaults=[0, 0, False, None])
+
+def por_dias(dias, margen=False, max_dias=None):
+    return Regla(dias=dias, margen=margen, max_dias=max_dias)
+
+def por_unidades(unidades, margen=False):
+    return Regla(unidades=unidades, margen=margen)
+
+NIVELES_STOCK = ('min', 'ideal', 'limite')
+
+# Reglas de C, D y E del análisis por rotación (el margen se aplica al límite)
+_CDE_ROTACION = {
+    'C': (por_unidades(1), por_unidades(1), por_unidades(1, margen=True)),
+    'D': (por_unidades(0), por_unidades(1), por_unidades(1, margen=True)),
+    'E': (por_unidades(0), por_unidades(0), por_unidades(0)),
+}
+# Reglas de C, D y E por tipo de pedido (el límite es un máximo fijo, sin margen)
+_CDE_PEDIDO = {
+    'C': (por_unidades(1), por_unidades(1), por_unidades(2)),
+    'D': (por_unidades(0), por_unidades(1), por_unidades(1)),
+    'E': (por_unidades(0), por_unidades(0), por_unidades(0)),
+}
+
+# Tipo de pedido -> categoría -> reglas (mín, ideal, límite). Para añadir un tipo de
+# pedido basta con añadir una entrada aquí.
+POLITICAS_STOCK = {
+    'Rotación (días configurados)': {
+        'A': (por_dias('stock_min_dias'), por_dias('dias_cobertura'), por_dias('dias_cobertura', margen=True)),
+        'B': (por_dias('stock_min_dias'), por_dias('dias_cobertura'), por_dias('dias_cobertura', margen=True)),
+        **_CDE_ROTACION,
+    },
+    'Directo Transfer': {
+        'A': (por_dias(8), por_dias('dias_cobertura'), por_dias(15)),
+        'B': (por_dias(8), por_dias('dias_cobertura'), por_dias(15)),
+        **_CDE_PEDIDO,
+    },
+    'Grupo Compras/Plataforma': {
+        'A': (por_dias(3), por_dias('dias_cobertura'), por_dias(15)),
+        'B': (por_dias(3), por_dias('dias_cobertura', max_dias=9), por_dias(9)),
+        **_CDE_PEDIDO,
+    },
+    'Mayorista Club Genericos': {
+        'A': (por_dias(2), por_dias(2.5), por_dias(3)),
+        'B': (por_dias(2), por_dias(2.5), por_dias(3)),
+        **_CDE_PEDIDO,
+    },
+    'Especiales': {
+        'A': (por_dias(1), por_dias(1.5), por_dias(2)),
+        'B': (por_dias(1), por_dias(1.5), por_dias(2)),
+        **_CDE_PEDIDO,
+    },
+}
+TIPO_PEDIDO_DEFECTO = 'Rotación (días configurados)'
+
+# ==================== VERSIÓN DEL PARSER ====================
+# Incrementar cuando cambie ingerir_excel para invalidar las entradas cacheadas
+VERSION_PARSER = 6
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Detalle de productos por páginas: filtrado, orden y corte en el servidor."""
+import numpy as np
+import pandas as pd
+
+from .filtros import IndiceFiltros
+from .instrumentacion import medido
+from .tipos import Columnas
+
+FILAS_POR_PAGINA = 50
+
+
+def columnas_detalle(df: pd.DataFrame, cols: Columnas) -> list[str]:
+    """Columnas de la tabla de detalle, en el orden de las versiones anteriores"""
+    columnas = [cols['cn'], cols['descripcion']]
+    if cols['categoria_funcional']:
+        columnas += ['Familia', 'Subfamilia']
+    columnas += ['Categoria', 'Total_Ventas', 'Vtas_Dia', cols['stock_actual'],
+                 'Stock_Min_Calc', 'Stock_Ideal', 'Stock_Limite', 'Indice_Rotacion', 'Reposicion',
+                 'Stock_Sobrante_Uds', 'Stock_Faltante_Uds', 'Valor_Stock_Actual', 'Stock_Sobrante',
+                 'Stock_Faltante']
+    return [c for c in columnas if c and c in df.columns]
+
+def filas_filtradas(df: pd.DataFrame, filtros: dict[str, list],
+                    indice: IndiceFiltros | None = None) -> np.ndarray:
+    """Posiciones de las filas cuyos valores están en cada filtro {columna: valores}.
+    
+    Los filtros vacíos no restringen. Con el IndiceFiltros del DataFrame se resuelve
+    con sus mapas de bits; sin él, con máscaras booleanas (nunca con copias del DataFrame).
+    """
+    if indice is not None:
+        return indice.filas_filtradas(filtros)
+    mascara = np.ones(len(df), dtype=bool)
+    for columna, valores in filtros.items():
+        if valores:
+            mascara &= df[columna].isin(valores).to_numpy()
+    return np.flatnonzero(mascara)
+
+def ordenar_filas(df: pd.DataFrame, columna: str, ascendente: bool = True,
+                  filas: np.ndarray | None = None) -> np.ndarray:
+    """Posiciones de las filas ordenadas por una columna (nulos al final, orden estable).
+    
+    Solo se ordena esa columna, no el DataFrame entero.
+    """
+    serie = df[columna] if filas is None else df[columna].iloc[filas]
+    orden = (serie.reset_index(drop=True)
+             .sort_values(ascending=ascendente, kind='stable', na_position='last')
+             .index.to_numpy())
+    return orden if filas is None else filas[orden]
+
+@medido(nombre='detalle')
+def pagina_detalle(df: pd.DataFrame, columnas: list[str], pagina: int = 0,
+                   filas_por_pagina: int = FILAS_POR_PAGINA, orden: str | None = None,
+                   ascendente: bool = True, filas: np.ndarray | None = None) -> tuple[pd.DataFrame, int]:
+    """Una página de la tabla de detalle y el número total de filas.
+    
+    filas (de filas_filtradas) limita las filas consideradas. Solo la página
+    devuelta se copia y redondea; el resto del DataFrame no se toca.
+    """
+    if orden is not None:
+        filas = ordenar_filas(df, orden, ascendente, filas)
+    total = len(df) if filas is None else len(filas)
+    inicio = pagina * filas_por_pagina
+    if filas is None:
+        seleccion = df.iloc[inicio:inicio + filas_por_pagina]
+    else:
+        seleccion = df.iloc[filas[inicio:inicio + filas_por_pagina]]
+    vista = seleccion[columnas]
+    decimales = {c: 2 for c in columnas if pd.api.types.is_float_dtype(vista[c])}
+    return vista.round(decimales), total
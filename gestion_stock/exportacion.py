@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Informes exportables: Excel de análisis completo y listado de CNs con exceso."""
+import importlib.util
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from .agregacion import hojas_resumen
+from .instrumentacion import medido
+from .multitienda import aplanar_columnas
+from .seleccion import filas_mayores
+from .tipos import Columnas
+
+# Columnas en euros: se escriben como números con este formato, no como texto
+COLUMNAS_EUROS = {'Valor_Stock_Actual', 'Valor_Stock_Ideal', 'Valor_Stock_Limite',
+                  'Stock_Sobrante', 'Stock_Faltante', 'Valor_Ventas'}
+FORMATO_EUROS = '#,##0.00 "€"'
+
+# Filas que se convierten a objetos de Python de una vez al escribir
+FILAS_POR_BLOQUE = 10_000
+
+
+def es_columna_euros(columna) -> bool:
+    # El PVP se detecta igual que en detectar_columnas
+    return columna in COLUMNAS_EUROS or str(columna).lower() == 'pvp'
+
+def filas_por_bloques(df: pd.DataFrame, index: bool = False):
+    """Filas del DataFrame como listas de valores de Python (None para nulos), por bloques.
+    
+    Solo un bloque está convertido en memoria a la vez.
+    """
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+        bloque = df.iloc[inicio:inicio + FILAS_POR_BLOQUE]
+        series = ([bloque.index.to_series()] if index else []) + [bloque.iloc[:, i] for i in range(bloque.shape[1])]
+        columnas = [serie.astype(object).where(serie.notna(), None).tolist() for serie in series]
+        yield from zip(*columnas)
+
+def cabecera_hoja(df: pd.DataFrame, index: bool = False) -> list:
+    nombres = [str(c) for c in df.columns]
+    return [df.index.name or ''] + nombres if index else nombres
+
+def escribir_xlsx(hojas: list[tuple[str, pd.DataFrame, bool]]) -> bytes:
+    """Escribe [(nombre, df, ¿con índice?)] fila a fila con memoria constante.
+    
+    Usa xlsxwriter en modo constant_memory si está instalado y openpyxl en modo
+    write_only si no. Las columnas en euros llevan FORMATO_EUROS.
+    """
+    output = BytesIO()
+    if importlib.util.find_spec('xlsxwriter') is not None:
+        _escribir_xlsxwriter(hojas, output)
+    else:
+        _escribir_openpyxl(hojas, output)
+    return output.getvalue()
+
+def _escribir_xlsxwriter(hojas, output):
+    import xlsxwriter
+    
+    libro = xlsxwriter.Workbook(output, {'constant_memory': True, 'nan_inf_to_errors': True,
+                                         'strings_to_formulas': False, 'strings_to_urls': False})
+    negrita = libro.add_format({'bold': True})
+    euros = libro.add_format({'num_format': FORMATO_EUROS})
+    for nombre, df, index in hojas:
+        hoja = libro.add_worksheet(nombre)
+        cabecera = cabecera_hoja(df, index)
+        desplazamiento = 1 if index else 0
+        for i, columna in enumerate(df.columns):
+            if es_columna_euros(columna):
+                hoja.set_column(i + desplazamiento, i + desplazamiento, None, euros)
+        hoja.write_row(0, 0, cabecera, negrita)
+        for fila, valores in enumerate(filas_por_bloques(df, index), start=1):
+            hoja.write_row(fila, 0, valores)
+    libro.close()
+
+def _escribir_openpyxl(hojas, output):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    
+    libro = Workbook(write_only=True)
+    for nombre, df, index in hojas:
+        hoja = libro.create_sheet(nombre)
+        cabecera = []
+        for valor in cabecera_hoja(df, index):
+            celda = WriteOnlyCell(hoja, valor)
+            celda.font = Font(bold=True)
+            cabecera.append(celda)
+        hoja.append(cabecera)
+        
+        desplazamiento = 1 if index else 0
+        posiciones_euros = [i + desplazamiento for i, c in enumerate(df.columns) if es_columna_euros(c)]
+        for valores in filas_por_bloques(df, index):
+            if posiciones_euros:
+                valores = list(valores)
+                for i in posiciones_euros:
+                    if valores[i] is not None:
+                        celda = WriteOnlyCell(hoja, valores[i])
+                        celda.number_format = FORMATO_EUROS
+                        valores[i] = celda
+            hoja.append(valores)
+    libro.save(output)
+
+def productos_con_exceso(df: pd.DataFrame, limite: int | None = None) -> pd.DataFrame:
+    """Productos con stock por encima del ideal, de mayor a menor valor sobrante.
+    
+    Con limite solo se seleccionan (sin ordenar el resto) los limite primeros. Los
+    empates quedan en el orden del DataFrame en los dos casos (orden estable).
+    """
+    if limite is not None:
+        return filas_mayores(df, 'Stock_Sobrante', limite, np.flatnonzero(df['Stock_Sobrante_Uds'] > 0))
+    return df[df['Stock_Sobrante_Uds'] > 0].sort_values('Stock_Sobrante', ascending=False, kind='stable')
+
+@medido
+def exportar_cns(df: pd.DataFrame, cols: Columnas) -> str:
+    """CNs de los productos con exceso, uno por línea"""
+    return "\n".join(productos_con_exceso(df)[cols['cn']].astype(str).tolist())
+
+@medido
+def exportar_analisis_completo(df: pd.DataFrame, cubo: pd.DataFrame) -> bytes:
+    """Excel con 'Datos Completos' y las hojas de resumen del cubo"""
+    hojas = [('Datos Completos', df, False)]
+    hojas += [(nombre, hoja, True) for nombre, hoja in hojas_resumen(cubo).items()]
+    return escribir_xlsx(hojas)
+
+@medido
+def exportar_comparativa(combinado: pd.DataFrame) -> bytes:
+    """Excel con la vista combinada por CN de varias farmacias (ver combinar_tiendas)"""
+    return escribir_xlsx([('Comparativa CN', aplanar_columnas(combinado), True)])
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Índice de mapas de bits por valor para filtrar por Categoria, Familia y Subfamilia."""
+import numpy as np
+import pandas as pd
+
+from .agregacion import DIMENSIONES_CUBO
+from .instrumentacion import medido
+
+
+class IndiceFiltros:
+    """Un mapa de bits empaquetado (8 filas por byte) por cada valor de cada columna.
+    
+    Se construye una vez por DataFrame; cualquier combinación de filtros se
+    resuelve con OR entre los valores de una columna y AND entre columnas, sin
+    crear máscaras ni copias del DataFrame. Las filas devueltas son posiciones (iloc).
+    """
+    
+    @medido(nombre='indice_filtros')
+    def __init__(self, df: pd.DataFrame, columnas: list[str] = DIMENSIONES_CUBO):
+        self.filas = len(df)
+        self._bytes = -(-len(df) // 8)
+        self._valores = {}  # columna -> valores distintos (ordenados)
+        self._mapas = {}    # columna -> matriz valores × bytes (uint8)
+        posicion = np.arange(len(df))
+        byte, bit = posicion >> 3, (128 >> (posicion & 7)).astype(np.uint8)
+        for columna in columnas:
+            if columna not in df.columns:
+                continue
+            codigos, valores = pd.factorize(df[columna], sort=True)
+            # Celdas (valor, byte) de cada fila; agrupadas, el OR de sus bits es el byte del mapa
+            orden = np.argsort(codigos, kind='stable')
+            orden = orden[codigos[orden] >= 0]
+            celdas = codigos[orden].astype(np.int64) * self._bytes + byte[orden]
+            inicios = np.flatnonzero(np.concatenate(([True], celdas[1:] != celdas[:-1])))
+            mapa = np.zeros(len(valores) * self._bytes, dtype=np.uint8)
+            if len(celdas):
+                mapa[celdas[inicios]] = np.bitwise_or.reduceat(bit[orden], inicios)
+            self._mapas[columna] = mapa.reshape(len(valores), self._bytes)
+            self._valores[columna] = pd.Index(valores)
+    
+    def memoria(self) -> int:
+        """Bytes ocupados por los mapas (para la caché)"""
+        return sum(mapa.nbytes for mapa in self._mapas.values())
+    
+    def mapa(self, filtros: dict[str, list]) -> np.ndarray | None:
+        """Mapa de bits de las filas que cumplen los filtros {columna: valores} (None: sin filtro)"""
+        resultado = None
+        for columna, valores in filtros.items():
+            if not valores:
+                continue
+            posiciones = self._valores[columna].get_indexer(list(valores))
+            mapas = self._mapas[columna][posiciones[posiciones >= 0]]
+            union = np.bitwise_or.reduce(mapas, axis=0) if len(mapas) else np.zeros(self._bytes, dtype=np.uint8)
+            resultado = union if resultado is None else np.bitwise_and(resultado, union, out=resultado)
+        return resultado
+    
+    def filas_filtradas(self, filtros: dict[str, list]) -> np.ndarray:
+        """Posiciones de las filas que cumplen los filtros (los filtros vacíos no restringen)"""
+        mapa = self.mapa(filtros)
+        if mapa is None:
+            return np.arange(self.filas)
+        return np.flatnonzero(np.unpackbits(mapa, count=self.filas))
+    
+    def contar(self, filtros: dict[str, list]) -> int:
+        """Número de filas que cumplen los filtros, sin obtener sus posiciones"""
+        mapa = self.mapa(filtros)
+        return self.filas if mapa is None else int(np.bitwise_count(mapa).sum())
+    
+    def valores(self, columna: str, filtros: dict[str, list] | None = None) -> list:
+        """Valores de la columna presentes en las filas que cumplen los filtros, ordenados"""
+        mapa = self.mapa(filtros or {})
+        mapas = self._mapas[columna]
+        presentes = mapas.any(axis=1) if mapa is None else (mapas & mapa).any(axis=1)
+        return self._valores[columna][presentes].tolist()
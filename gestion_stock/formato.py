@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Formato de cifras al estilo español (1.234,56)."""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def formato_euros(valor: float) -> str:
+    return f"{valor:,.2f}€".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def formato_numero(valor: float, decimales: int = 2) -> str:
+    return f"{valor:,.{decimales}f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def _como_texto(enteros: np.ndarray) -> pa.Array:
+    return pc.cast(pa.array(enteros), pa.string())
+
+def unidades_redondeadas(absolutos: np.ndarray, decimales: int) -> np.ndarray:
+    """round(x · 10^decimales) como entero, igual que el redondeo correcto de format().
+    
+    absolutos · 10^decimales tiene error de redondeo: si su parte fraccionaria
+    está cerca de 0,5 (o el número es demasiado grande para float64 exacto), el
+    resultado se toma de format() de Python para esos valores. Los que no caben
+    en int64 quedan a 0 (formatear_numeros los formatea uno a uno).
+    """
+    escala = 10 ** decimales
+    escalados = absolutos * escala
+    unidades = np.round(escalados)
+    cerca_de_medio = np.abs(escalados - np.floor(escalados) - 0.5) <= 8 * np.finfo(float).eps * escalados
+    cabe = escalados < 2.0 ** 62
+    dudosos = (cerca_de_medio | (escalados >= 2.0 ** 52)) & cabe
+    unidades = np.where(cabe, unidades, 0).astype(np.int64)
+    unidades[dudosos] = [int(f"{v:.{decimales}f}".replace(".", "")) for v in absolutos[dudosos].tolist()]
+    return unidades
+
+def formatear_numeros(valores, decimales: int = 2, sufijo: str = "") -> pd.Series:
+    """Columna completa como texto al estilo español, sin formatear celda a celda.
+    
+    Mismo resultado que formato_numero por celda: la parte entera y los decimales
+    salen de unidades_redondeadas y los grupos de miles se componen con
+    operaciones de Arrow sobre la columna entera. Nulos e infinitos quedan <NA>.
+    """
+    serie = pd.Series(valores, copy=False)
+    numeros = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    nulos = ~np.isfinite(numeros)
+    absolutos = np.abs(np.where(nulos, 0.0, numeros))
+    entero, fraccion = np.divmod(unidades_redondeadas(absolutos, decimales), 10 ** decimales)
+    
+    # Grupos de miles de derecha a izquierda, con ceros a la izquierda salvo el primero
+    miles = pa.nulls(len(numeros), pa.string()).fill_null("")
+    while (entero >= 1000).any():
+        con_miles = entero >= 1000
+        grupo = pc.utf8_lpad(_como_texto(entero % 1000), 3, "0")
+        miles = pc.if_else(pa.array(con_miles), pc.binary_join_element_wise(".", grupo, miles, ""), miles)
+        entero = np.where(con_miles, entero // 1000, entero)
+    
+    partes = [pc.if_else(pa.array(np.signbit(numeros)), "-", ""), _como_texto(entero), miles]
+    if decimales > 0:
+        partes += [",", pc.utf8_lpad(_como_texto(fraccion), decimales, "0")]
+    texto = pc.binary_join_element_wise(*partes, sufijo, "")
+    resultado = pd.Series(pd.arrays.ArrowStringArray(texto), index=serie.index, name=serie.name)
+    enormes = np.flatnonzero(absolutos * 10 ** decimales >= 2.0 ** 62)
+    if len(enormes):
+        resultado.iloc[enormes] = [formato_numero(v, decimales) + sufijo for v in numeros[enormes].tolist()]
+    return resultado.mask(nulos)
+
+def formatear_euros(valores) -> pd.Series:
+    """formato_euros para una columna completa (ver formatear_numeros)"""
+    return formatear_numeros(valores, sufijo="€")
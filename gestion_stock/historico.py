@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Histórico de análisis: instantáneas en Parquet por farmacia y fecha, con un índice.
+
+Estructura en disco:
+
+    <raiz>/indice.json
+    <raiz>/farmacia=<farmacia>/fecha=<AAAA-MM-DD>/analisis.parquet
+
+Cada instantánea es el DataFrame ingerido (sin niveles de stock, que dependen de los
+parámetros), de modo que cargarla no requiere volver a leer el Excel y mover los
+sliders no la reescribe. El índice guarda además los totales de cada instantánea,
+calculados siempre con PARAMETROS_TOTALES, así que las vistas de evolución
+comparan lo mismo y no abren ningún Parquet.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from dataclasses import asdict
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+
+from .instrumentacion import medido
+from .niveles import COLUMNAS_NIVELES, calcular_niveles
+from .tipos import Columnas, Parametros
+
+ARCHIVO_INDICE = 'indice.json'
+ARCHIVO_SNAPSHOT = 'analisis.parquet'
+COMPRESION = 'zstd'
+
+# Totales guardados en el índice: nombre -> columna del DataFrame procesado
+TOTALES_SNAPSHOT = {
+    'valor_stock': 'Valor_Stock_Actual',
+    'valor_ideal': 'Valor_Stock_Ideal',
+    'exceso': 'Stock_Sobrante',
+    'deficit': 'Stock_Faltante',
+    'ventas': 'Total_Ventas',
+}
+# Parámetros de los niveles con los que se calculan esos totales, iguales para todas las instantáneas
+PARAMETROS_TOTALES = Parametros()
+
+
+def nombre_particion(farmacia: str) -> str:
+    """Nombre de farmacia apto para directorio ('Farmacia Pérez 2' -> 'farmacia_perez_2')"""
+    texto = unicodedata.normalize('NFKD', farmacia).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', texto.lower()).strip('_') or 'farmacia'
+
+def _fecha_iso(fecha) -> str:
+    if fecha is None:
+        return date.today().isoformat()
+    if isinstance(fecha, str):
+        return date.fromisoformat(fecha).isoformat()
+    return fecha.isoformat()[:10]
+
+def totales_snapshot(df: pd.DataFrame, cols: Columnas) -> dict[str, float]:
+    """TOTALES_SNAPSHOT del DataFrame ingerido con los niveles de PARAMETROS_TOTALES"""
+    p = PARAMETROS_TOTALES
+    df = calcular_niveles(df, cols, p.dias_abierto, p.stock_min_dias, p.dias_cobertura,
+                          p.margen_seguridad, p.tipo_pedido)
+    return {nombre: float(df[col].sum()) for nombre, col in TOTALES_SNAPSHOT.items() if col in df}
+
+class AlmacenSnapshots:
+    """Instantáneas de análisis en Parquet con un índice JSON.
+    
+    Una instantánea por farmacia y fecha: guardar otra el mismo día la sustituye.
+    Las escrituras son atómicas (archivo temporal + os.replace). Desde varios
+    procesos, cada uno escribe su Parquet con escribir() y un único proceso
+    actualiza el índice con indexar().
+    """
+    
+    def __init__(self, raiz):
+        self.raiz = Path(raiz)
+        self._lock = threading.Lock()
+    
+    @property
+    def ruta_indice(self) -> Path:
+        return self.raiz / ARCHIVO_INDICE
+    
+    def ruta(self, farmacia: str, fecha) -> Path:
+        return (self.raiz / f"farmacia={nombre_particion(farmacia)}" / f"fecha={_fecha_iso(fecha)}"
+                / ARCHIVO_SNAPSHOT)
+    
+    def _leer_indice(self) -> list[dict]:
+        try:
+            return json.loads(self.ruta_indice.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return []
+    
+    def _escribir_indice(self, entradas: list[dict]):
+        self.raiz.mkdir(parents=True, exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=self.raiz, suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+            json.dump(entradas, f, ensure_ascii=False, indent=1)
+        os.replace(temporal, self.ruta_indice)
+    
+    def entrada(self, farmacia: str, fecha) -> dict | None:
+        """Entrada del índice de una instantánea (None si no existe)"""
+        clave = (nombre_particion(farmacia), _fecha_iso(fecha))
+        return next((e for e in self._leer_indice() if (e['particion'], e['fecha']) == clave), None)
+    
+    def escribir(self, df: pd.DataFrame, cols: Columnas, farmacia: str, fecha=None,
+                 huella: str | None = None) -> dict:
+        """Escribe el Parquet de la instantánea sin tocar el índice y devuelve su entrada.
+        
+        df puede ser el ingerido o el ya procesado: las columnas de niveles no se guardan.
+        Se puede llamar desde otro proceso; la entrada se registra luego con indexar().
+        """
+        fecha = _fecha_iso(fecha)
+        ruta = self.ruta(farmacia, fecha)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        df = df.drop(columns=[c for c in COLUMNAS_NIVELES if c in df.columns])
+        # Parquet exige nombres de columna de texto
+        datos = df.rename(columns=str).reset_index(drop=True)
+        datos.attrs = {}
+        temporal = ruta.with_suffix('.tmp')
+        datos.to_parquet(temporal, compression=COMPRESION, index=False)
+        os.replace(temporal, ruta)
+        
+        return {
+            'farmacia': farmacia,
+            'particion': nombre_particion(farmacia),
+            'fecha': fecha,
+            'ruta': ruta.relative_to(self.raiz).as_posix(),
+            'filas': len(df),
+            'columnas': {clave: None if col is None else str(col) for clave, col in cols.items()},
+            'parametros': asdict(PARAMETROS_TOTALES),
+            'huella': huella,
+            'guardado': datetime.now().isoformat(timespec='seconds'),
+            'bytes': ruta.stat().st_size,
+            **totales_snapshot(df, cols),
+        }
+    
+    def indexar(self, entrada: dict):
+        """Añade la entrada al índice, sustituyendo la de la misma farmacia y fecha"""
+        with self._lock:
+            clave = (entrada['particion'], entrada['fecha'])
+            entradas = [e for e in self._leer_indice() if (e['particion'], e['fecha']) != clave]
+            entradas.append(entrada)
+            entradas.sort(key=lambda e: (e['particion'], e['fecha']))
+            self._escribir_indice(entradas)
+    
+    @medido(nombre='guardar_snapshot')
+    def guardar(self, df: pd.DataFrame, cols: Columnas, farmacia: str, fecha=None,
+                huella: str | None = None) -> dict:
+        """Guarda el DataFrame como instantánea y devuelve su entrada del índice.
+        
+        huella identifica los datos (p. ej. el hash del Excel, sin los parámetros): si
+        la instantánea de ese día ya la tiene, no se vuelve a escribir.
+        """
+        previa = self.entrada(farmacia, fecha)
+        if previa is not None and huella is not None and previa.get('huella') == huella:
+            return previa
+        entrada = self.escribir(df, cols, farmacia, fecha, huella)
+        self.indexar(entrada)
+        return entrada
+    
+    @medido(nombre='cargar_snapshot')
+    def cargar(self, farmacia: str, fecha) -> tuple[pd.DataFrame, Columnas]:
+        """DataFrame ingerido (sin niveles) y columnas detectadas de una instantánea"""
+        entrada = self.entrada(farmacia, fecha)
+        if entrada is None:
+            raise KeyError(f"No hay instantánea de {farmacia} del {_fecha_iso(fecha)}")
+        # Las cadenas se guardaron como Arrow; se recuperan igual (no como objetos de Python)
+        with pd.option_context('mode.string_storage', 'pyarrow'):
+            df = pd.read_parquet(self.raiz / entrada['ruta'])
+        return df, entrada['columnas']
+    
+    def listar(self, farmacia: str | None = None) -> pd.DataFrame:
+        """Índice de instantáneas (de una farmacia o de todas) ordenado por farmacia y fecha"""
+        entradas = self._leer_indice()
+        if farmacia is not None:
+            entradas = [e for e in entradas if e['particion'] == nombre_particion(farmacia)]
+        indice = pd.DataFrame(entradas)
+        if not indice.empty:
+            indice['fecha'] = pd.to_datetime(indice['fecha'])
+        return indice
+    
+    def farmacias(self) -> list[str]:
+        """Farmacias con alguna instantánea (nombre de la última guardada)"""
+        nombres = {}
+        for e in self._leer_indice():
+            nombres[e['particion']] = e['farmacia']
+        return sorted(nombres.values())
+    
+    def tendencia(self, farmacia: str) -> pd.DataFrame:
+        """Totales por fecha de una farmacia, leídos solo del índice"""
+        indice = self.listar(farmacia)
+        if indice.empty:
+            return indice
+        return indice.set_index('fecha')[[n for n in TOTALES_SNAPSHOT if n in indice] + ['filas']]
+    
+    def eliminar(self, farmacia: str, fecha):
+        """Borra una instantánea y su entrada del índice"""
+        with self._lock:
+            entradas = self._leer_indice()
+            clave = (nombre_particion(farmacia), _fecha_iso(fecha))
+            restantes = [e for e in entradas if (e['particion'], e['fecha']) != clave]
+            if len(restantes) == len(entradas):
+                raise KeyError(f"No hay instantánea de {farmacia} del {clave[1]}")
+            self.ruta(farmacia, fecha).unlink(missing_ok=True)
+            self._escribir_indice(restantes)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Etapa 1 del análisis (independiente de parámetros): lectura, limpieza y tipos compactos."""
+import numpy as np
+import pandas as pd
+
+from .clasificacion import categorizar_productos, extraer_familias
+from .instrumentacion import medido
+from .lectura import columnas_ventas_mensuales, leer_excel
+from .tipos import Columnas
+
+
+def calcular_ventas_totales(df: pd.DataFrame, col_total: str | None) -> pd.Series:
+    """Calcula las ventas totales desde columna TOTAL o sumando meses"""
+    if col_total:
+        return pd.to_numeric(df[col_total], errors='coerce').fillna(0)
+    
+    # Buscar columnas mensuales
+    columnas_ventas = columnas_ventas_mensuales(df.columns)
+    
+    if columnas_ventas:
+        return df[columnas_ventas].apply(pd.to_numeric, errors='coerce').fillna(0).sum(axis=1)
+    
+    return pd.Series(0, index=df.index)
+
+# ==================== TIPOS COMPACTOS ====================
+def numerico_compacto(serie: pd.Series) -> pd.Series:
+    """Convierte una columna numérica al tipo más estrecho que conserva todos sus valores"""
+    valores = serie.to_numpy(dtype=float)
+    if np.isfinite(valores).all() and (valores == np.round(valores)).all():
+        return pd.to_numeric(serie, downcast='integer')
+    if np.array_equal(valores.astype(np.float32).astype(float), valores, equal_nan=True):
+        return serie.astype(np.float32)
+    return serie
+
+def texto_compacto(serie: pd.Series) -> pd.Series:
+    """Texto casi único (descripciones, CN alfanumérico) como cadena de Arrow"""
+    try:
+        return serie.astype('string[pyarrow]')
+    except ImportError:
+        return serie
+
+@medido
+def compactar_tipos(df: pd.DataFrame, cols: Columnas) -> tuple[pd.DataFrame, dict]:
+    """Normaliza el DataFrame ingerido a tipos compactos e informa de los bytes antes/después.
+    
+    - Etiquetas (categoría funcional, Familia, Subfamilia) -> category
+    - Cantidades (stock, ventas, PVP) -> el int/float más estrecho sin pérdida
+    - CN -> entero de ancho fijo si es numérico, cadena de Arrow si no
+    - Descripción -> cadena de Arrow
+    """
+    antes = int(df.memory_usage(deep=True).sum())
+    df = df.copy(deep=False)
+    
+    for col in [cols['categoria_funcional'], 'Familia', 'Subfamilia']:
+        if col in df.columns and col != 'Categoria':
+            df[col] = df[col].astype('category')
+    
+    numericas = [cols['stock_actual'], cols['pvp'], 'Total_Ventas']
+    numericas += [cols['total']] if cols['total'] else columnas_ventas_mensuales(df.columns.drop('Total_Ventas'))
+    for col in dict.fromkeys(numericas):
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = numerico_compacto(df[col])
+    
+    if cols['cn'] and cols['cn'] in df.columns:
+        cn = df[cols['cn']]
+        if pd.api.types.is_numeric_dtype(cn) and not cn.isna().any():
+            df[cols['cn']] = numerico_compacto(cn)
+        elif not pd.api.types.is_numeric_dtype(cn):
+            df[cols['cn']] = texto_compacto(cn)
+    
+    if cols['descripcion'] and cols['descripcion'] in df.columns:
+        df[cols['descripcion']] = texto_compacto(df[cols['descripcion']])
+    
+    despues = int(df.memory_usage(deep=True).sum())
+    return df, {'bytes_antes': antes, 'bytes_despues': despues}
+
+# ==================== INGESTA ====================
+@medido(nombre='ingesta')
+def ingerir_excel(contenido: bytes) -> tuple[pd.DataFrame, Columnas]:
+    """Etapa 1 (independiente de parámetros): lee, limpia y clasifica el Excel.
+    
+    Las aplicaciones la cachean por el contenido del archivo (ver CacheIngesta), así
+    que mover los sliders no vuelve a leer el Excel ni a limpiar PVP o familias.
+    El DataFrame devuelto se comparte entre sesiones y no debe modificarse.
+    """
+    # Leer Excel (solo las columnas necesarias) y detectar columnas
+    df, cols = leer_excel(contenido)
+    
+    # Procesar familias funcionales (antes de que 'Categoria' pase a ser la clase ABCDE,
+    # ya que la columna de categorías del Excel puede llamarse también 'Categoria')
+    if cols['categoria_funcional']:
+        familias = extraer_familias(df[cols['categoria_funcional']])
+        subfamilias = df[cols['categoria_funcional']]
+    else:
+        familias = 'SIN CLASIFICAR'
+        subfamilias = 'SIN CLASIFICAR'
+    
+    # Calcular ventas totales
+    df['Total_Ventas'] = calcular_ventas_totales(df, cols['total'])
+    
+    # Categorizar productos
+    df['Categoria'] = categorizar_productos(df['Total_Ventas'])
+    
+    # Limpiar y procesar PVP
+    if cols['pvp']:
+        df[cols['pvp']] = df[cols['pvp']].astype(str).str.replace('€', '').str.replace(',', '.').str.strip()
+        df[cols['pvp']] = pd.to_numeric(df[cols['pvp']], errors='coerce').fillna(0)
+    
+    # Procesar stock actual
+    if cols['stock_actual']:
+        df[cols['stock_actual']] = pd.to_numeric(df[cols['stock_actual']], errors='coerce').fillna(0)
+    
+    df['Familia'] = familias
+    df['Subfamilia'] = subfamilias
+    
+    # Tipos compactos: el DataFrame se guarda en la caché durante horas
+    lectura = df.attrs.get('lectura')
+    df, informe = compactar_tipos(df, cols)
+    df.attrs['lectura'] = lectura
+    df.attrs['memoria'] = informe
+    
+    return df, cols
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Medición por etapas (tiempo y memoria) con coste prácticamente nulo si está desactivada.
+
+Las funciones del núcleo y de las aplicaciones se marcan con @medido o con un
+bloque `with etapa('nombre')`. Solo se mide dentro de `with registrar() as registro`;
+fuera de él cada marca cuesta una consulta a un ContextVar.
+
+    with registrar(memoria=True) as registro:
+        analizar_excel(contenido)
+    print(registro.linea_log())
+"""
+import contextvars
+import functools
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_registro_actual = contextvars.ContextVar('registro_instrumentacion', default=None)
+_NULO = nullcontext()
+
+
+def rss_pico_mb() -> float | None:
+    """Pico de memoria residente del proceso (None si el sistema no lo ofrece)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en bytes en macOS y en KB en Linux
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+class Registro:
+    """Mediciones de una ejecución: una entrada por etapa, en orden de inicio.
+    
+    Con memoria=True se usa tracemalloc para el pico de memoria reservada en
+    cada etapa (incluidas sus subetapas); es bastante más lento.
+    """
+    
+    def __init__(self, memoria: bool = False):
+        self.memoria = memoria
+        self.etapas = []  # dicts: nombre, nivel, segundos, pico_mb, rss_mb
+        self._pila = []
+        self.inicio = time.perf_counter()
+        self.segundos = None
+    
+    @contextmanager
+    def etapa(self, nombre: str):
+        medicion = {'nombre': nombre, 'nivel': len(self._pila), 'segundos': None,
+                    'pico_mb': None, 'rss_mb': None}
+        self.etapas.append(medicion)
+        if self.memoria:
+            actual, pico = tracemalloc.get_traced_memory()
+            if self._pila:
+                self._pila[-1]['_pico'] = max(self._pila[-1]['_pico'], pico)
+            tracemalloc.reset_peak()
+            marco = {'_base': actual, '_pico': 0}
+        else:
+            marco = {}
+        self._pila.append(marco)
+        inicio = time.perf_counter()
+        try:
+            yield medicion
+        finally:
+            medicion['segundos'] = time.perf_counter() - inicio
+            self._pila.pop()
+            if self.memoria:
+                pico = max(marco['_pico'], tracemalloc.get_traced_memory()[1])
+                medicion['pico_mb'] = (pico - marco['_base']) / (1024 * 1024)
+                if self._pila:
+                    self._pila[-1]['_pico'] = max(self._pila[-1]['_pico'], pico)
+            medicion['rss_mb'] = rss_pico_mb()
+    
+    def cerrar(self):
+        self.segundos = time.perf_counter() - self.inicio
+    
+    def como_dict(self) -> dict:
+        return {
+            'segundos': self.segundos,
+            'rss_mb': rss_pico_mb(),
+            'etapas': [{clave: valor for clave, valor in m.items() if valor is not None} for m in self.etapas],
+        }
+    
+    def linea_log(self, **contexto) -> str:
+        """Una línea JSON con el contexto dado (archivo, parámetros...) y las mediciones"""
+        return json.dumps({'evento': 'instrumentacion', **contexto, **self.como_dict()},
+                          ensure_ascii=False, default=str)
+
+@contextmanager
+def registrar(memoria: bool = False):
+    """Activa la medición en el bloque y devuelve el Registro con los resultados"""
+    registro = Registro(memoria)
+    iniciar_trazas = memoria and not tracemalloc.is_tracing()
+    if iniciar_trazas:
+        tracemalloc.start()
+    token = _registro_actual.set(registro)
+    try:
+        yield registro
+    finally:
+        _registro_actual.reset(token)
+        registro.cerrar()
+        if iniciar_trazas:
+            tracemalloc.stop()
+
+def etapa(nombre: str):
+    """Bloque medido si hay un registro activo; si no, un contexto vacío"""
+    registro = _registro_actual.get()
+    if registro is None:
+        return _NULO
+    return registro.etapa(nombre)
+
+def medido(funcion=None, *, nombre=None):
+    """Decorador que mide cada llamada a la función como una etapa (por defecto, con su nombre)"""
+    if funcion is None:
+        return functools.partial(medido, nombre=nombre)
+    nombre_etapa = nombre or funcion.__name__
+    
+    @functools.wraps(funcion)
+    def envoltorio(*args, **kwargs):
+        registro = _registro_actual.get()
+        if registro is None:
+            return funcion(*args, **kwargs)
+        with registro.etapa(nombre_etapa):
+            return funcion(*args, **kwargs)
+    return envoltorio
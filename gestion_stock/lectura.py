@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""Lectura del Excel del ERP y detección de sus columnas."""
+import importlib.util
+import time
+from io import BytesIO
+from operator import itemgetter
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from .instrumentacion import medido
+from .tipos import Columnas
+
+
+# ==================== DETECCIÓN DE COLUMNAS ====================
+def detectar_columnas(df: pd.DataFrame) -> Columnas:
+    """Detecta automáticamente las columnas relevantes del DataFrame"""
+    cols = {
+        'total': None, 'stock_actual': None, 'pvp': None, 
+        'cn': None, 'descripcion': None, 'categoria_funcional': None
+    }
+    
+    for col in df.columns:
+        col_lower = str(col).lower()
+        
+        if 'total' in col_lower and 'ventas' not in col_lower and cols['total'] is None:
+            cols['total'] = col
+        elif 'stock' in col_lower and 'actual' in col_lower:
+            cols['stock_actual'] = col
+        elif col_lower == 'pvp':
+            cols['pvp'] = col
+        elif col_lower in ['cn', 'codigo'] or 'idarti' in col_lower:
+            if cols['cn'] is None:
+                cols['cn'] = col
+        elif 'descripcion' in col_lower or 'descripción' in col_lower:
+            cols['descripcion'] = col
+        elif ('categoria' in col_lower and 'funcional' in col_lower) or col_lower in ['categoria', 'categoría']:
+            if cols['categoria_funcional'] is None:
+                cols['categoria_funcional'] = col
+    
+    return cols
+
+def columnas_ventas_mensuales(columnas) -> list:
+    """Columnas de ventas mensuales (se usan cuando no hay columna TOTAL)"""
+    meses = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+             'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
+    
+    columnas_ventas = []
+    for col in columnas:
+        col_lower = str(col).lower()
+        if 'ventas' in col_lower or any(mes in col_lower for mes in meses):
+            columnas_ventas.append(col)
+    
+    return columnas_ventas
+
+# ==================== LECTURA DEL EXCEL ====================
+def normalizar_cabecera(cabecera) -> list:
+    """Nombres de columna tal y como los genera pd.read_excel ('Unnamed: i', duplicados '.1')"""
+    nombres = []
+    vistos = {}
+    for i, nombre in enumerate(cabecera):
+        if nombre is None:
+            nombre = f"Unnamed: {i}"
+        if nombre in vistos:
+            vistos[nombre] += 1
+            nombres.append(f"{nombre}.{vistos[nombre]}")
+        else:
+            vistos[nombre] = 0
+            nombres.append(nombre)
+    return nombres
+
+def columnas_necesarias(cols: Columnas, columnas) -> list:
+    """Columnas del Excel que usa el análisis, en el orden original del archivo"""
+    necesarias = {cols[clave] for clave in ('cn', 'descripcion', 'pvp', 'stock_actual', 'categoria_funcional')
+                  if cols[clave] is not None}
+    if cols['total'] is not None:
+        necesarias.add(cols['total'])
+    else:
+        necesarias.update(columnas_ventas_mensuales(columnas))
+    return [col for col in columnas if col in necesarias]
+
+def valor_celda(valor):
+    """Normaliza una celda de texto igual que pd.read_excel: '' -> None, 12.0 -> 12"""
+    if valor == '':
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+def construir_dataframe(filas) -> tuple[pd.DataFrame, Columnas]:
+    """Materializa únicamente las columnas necesarias a partir de un iterable de filas.
+    
+    Primero se lee la cabecera y se detectan las columnas; después se recorren
+    las filas guardando solo esas columnas. Las columnas numéricas (stock actual,
+    TOTAL o meses) se convierten directamente a arrays float64. El resultado es
+    el mismo sea cual sea el motor que produce las filas.
+    """
+    filas = iter(filas)
+    cabecera = normalizar_cabecera(next(filas, ()))
+    cols = detectar_columnas(pd.DataFrame(columns=cabecera))
+    # Sin ninguna columna reconocida se conserva el archivo completo
+    seleccion = columnas_necesarias(cols, cabecera) or cabecera
+    
+    indices = [cabecera.index(col) for col in seleccion]
+    ancho = max(indices, default=-1) + 1
+    tomar = itemgetter(*indices) if len(indices) > 1 else (lambda fila: tuple(fila[i] for i in indices))
+    
+    datos = []
+    for fila in filas:
+        if len(fila) < ancho:
+            fila = tuple(fila) + (None,) * (ancho - len(fila))
+        datos.append(tomar(fila))
+    
+    # Igual que pd.read_excel, descartar las filas vacías del final
+    while datos and all(valor is None or valor == '' for valor in datos[-1]):
+        datos.pop()
+    
+    numericas = {cols['stock_actual']} | set(columnas_ventas_mensuales(seleccion) if cols['total'] is None
+                                             else [cols['total']])
+    columnas = zip(*datos) if datos else ([] for _ in seleccion)
+    
+    df = pd.DataFrame({
+        col: (pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce').to_numpy(dtype=float)
+              if col in numericas
+              else pd.Series([valor_celda(v) for v in valores], dtype=object).infer_objects())
+        for col, valores in zip(seleccion, columnas)
+    })
+    return df, cols
+
+# ---------- Motores de lectura ----------
+def filas_calamine(contenido: bytes):
+    """Filas de la primera hoja con python-calamine (Rust; .xlsx y .xls)"""
+    from python_calamine import CalamineWorkbook
+    
+    hoja = CalamineWorkbook.from_filelike(BytesIO(contenido)).get_sheet_by_index(0)
+    yield from hoja.iter_rows()
+
+def filas_xlrd(contenido: bytes):
+    """Filas de la primera hoja de un .xls antiguo con xlrd"""
+    import xlrd
+    
+    libro = xlrd.open_workbook(file_contents=contenido, on_demand=True)
+    try:
+        hoja = libro.sheet_by_index(0)
+        for i in range(hoja.nrows):
+            yield hoja.row_values(i)
+    finally:
+        libro.release_resources()
+
+def filas_openpyxl(contenido: bytes):
+    """Filas de la primera hoja de un .xlsx con openpyxl en modo solo lectura (streaming)"""
+    wb = load_workbook(BytesIO(contenido), read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+# Motores por orden de preferencia: (nombre, módulo requerido, formatos, generador de filas)
+LECTORES_EXCEL = [
+    ('calamine', 'python_calamine', {'xlsx', 'xls'}, filas_calamine),
+    ('xlrd', 'xlrd', {'xls'}, filas_xlrd),
+    ('openpyxl', 'openpyxl', {'xlsx'}, filas_openpyxl),
+]
+
+def detectar_formato(contenido: bytes) -> str | None:
+    """Formato del archivo según su firma: 'xlsx' (zip) o 'xls' (OLE2)"""
+    if contenido[:4] == b'PK\x03\x04':
+        return 'xlsx'
+    if contenido[:8] == b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1':
+        return 'xls'
+    return None
+
+def motores_disponibles(formato: str) -> list[str]:
+    """Nombres de los motores instalados capaces de leer el formato, por preferencia"""
+    return [nombre for nombre, modulo, formatos, _ in LECTORES_EXCEL
+            if formato in formatos and importlib.util.find_spec(modulo) is not None]
+
+@medido(nombre='lectura')
+def leer_excel(contenido: bytes) -> tuple[pd.DataFrame, Columnas]:
+    """Lee el archivo subido con el motor más rápido instalado, pasando al siguiente si falla.
+    
+    El motor utilizado y el tiempo de lectura quedan en df.attrs['lectura'].
+    """
+    formato = detectar_formato(contenido)
+    if formato is None:
+        raise ValueError("Formato de archivo no reconocido: se esperaba un Excel .xlsx o .xls")
+    
+    motores = motores_disponibles(formato)
+    if not motores:
+        raise ValueError(f"No hay ningún motor instalado para leer archivos .{formato} "
+                         "(instale python-calamine o xlrd)")
+    
+    generadores = {nombre: filas for nombre, _, _, filas in LECTORES_EXCEL}
+    errores = []
+    for nombre in motores:
+        inicio = time.perf_counter()
+        try:
+            df, cols = construir_dataframe(generadores[nombre](contenido))
+        except Exception as e:
+            errores.append(f"{nombre}: {e}")
+            continue
+        df.attrs['lectura'] = {'motor': nombre, 'formato': formato,
+                               'segundos': time.perf_counter() - inicio}
+        return df, cols
+    
+    raise ValueError("No se pudo leer el archivo. " + " | ".join(errores))
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Análisis por lotes: procesa varios Excel del ERP en paralelo y escribe los informes.
+
+Uso:
+    python -m gestion_stock EXPORTS/ --parametros parametros.toml --salida informes/
+    python -m gestion_stock "EXPORTS/*.xlsx" --procesos 8
+
+El archivo de parámetros (TOML o JSON) admite los campos de Parametros:
+dias_abierto, stock_min_dias, stock_max_dias, dias_cobertura, margen_seguridad y tipo_pedido.
+Por cada Excel se generan los mismos informes que descarga la aplicación:
+analisis_completo_<nombre>.xlsx y CNs_exceso_<nombre>.txt. Con --historico, cada
+análisis se guarda además como instantánea Parquet (ver historico.AlmacenSnapshots),
+con el nombre del archivo como farmacia salvo que --farmacia indique otro:
+
+    python -m gestion_stock ventas_20250630.xlsx --historico historico/ --farmacia "Farmacia Centro"
+    python -m gestion_stock EXPORTS/ --historico historico/ --farmacia centro_20250630.xlsx=Centro
+"""
+import argparse
+import dataclasses
+import glob
+import json
+import sys
+import time
+import tomllib
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from .analisis import analizar_excel
+from .cache import CacheIngesta
+from .configuracion import POLITICAS_STOCK
+from .exportacion import exportar_analisis_completo, exportar_cns
+from .formato import formato_euros
+from .historico import AlmacenSnapshots
+from .tipos import Parametros
+
+EXTENSIONES_EXCEL = ('.xlsx', '.xls')
+
+
+def cargar_parametros(ruta: str | None) -> Parametros:
+    """Parámetros del archivo TOML/JSON; los campos que falten toman el valor por defecto"""
+    if ruta is None:
+        return Parametros()
+    with open(ruta, 'rb') as f:
+        datos = tomllib.load(f) if ruta.endswith('.toml') else json.load(f)
+    
+    campos = {campo.name for campo in dataclasses.fields(Parametros)}
+    desconocidos = set(datos) - campos
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos en {ruta}: {', '.join(sorted(desconocidos))}")
+    parametros = Parametros(**datos)
+    if parametros.tipo_pedido not in POLITICAS_STOCK:
+        raise ValueError(f"Tipo de pedido desconocido: {parametros.tipo_pedido!r} "
+                         f"(opciones: {', '.join(POLITICAS_STOCK)})")
+    return parametros
+
+def buscar_excels(entradas: list[str]) -> list[Path]:
+    """Archivos Excel de los directorios o patrones glob indicados, sin repetir y ordenados"""
+    archivos = set()
+    for entrada in entradas:
+        ruta = Path(entrada)
+        candidatos = ruta.iterdir() if ruta.is_dir() else map(Path, glob.glob(entrada))
+        archivos.update(p for p in candidatos
+                        if p.is_file() and p.suffix.lower() in EXTENSIONES_EXCEL and not p.name.startswith('~$'))
+    return sorted(archivos)
+
+def asignar_farmacias(archivos: list[Path], valores: list[str] | None) -> dict[Path, str]:
+    """Farmacia de cada archivo según --farmacia: NOMBRE (un solo archivo) o ARCHIVO=NOMBRE.
+    
+    ARCHIVO es el nombre del archivo, con o sin extensión; los archivos sin
+    nombre asignado usan el suyo sin extensión.
+    """
+    farmacias = {ruta: ruta.stem for ruta in archivos}
+    for valor in valores or []:
+        archivo, igual, nombre = valor.rpartition('=')
+        if not igual:
+            if len(archivos) > 1:
+                raise ValueError(f"--farmacia {valor!r} con {len(archivos)} archivos: use ARCHIVO=NOMBRE")
+            archivo = archivos[0].name
+        nombre = nombre.strip()
+        rutas = [ruta for ruta in archivos if archivo in (ruta.name, ruta.stem)]
+        if not rutas or not nombre:
+            raise ValueError(f"--farmacia {valor!r} no corresponde a ningún archivo o no tiene nombre")
+        for ruta in rutas:
+            farmacias[ruta] = nombre
+    return farmacias
+
+def procesar_archivo(ruta: Path, parametros: Parametros, salida: Path,
+                     historico: Path | None = None, fecha: str | None = None,
+                     farmacia: str | None = None) -> dict:
+    """Analiza un Excel y escribe sus informes; se ejecuta en un proceso del pool.
+    
+    Con historico escribe también la instantánea de la farmacia (por defecto, el
+    nombre del archivo) y devuelve su entrada en 'snapshot' para que el proceso
+    principal la añada al índice.
+    """
+    inicio = time.perf_counter()
+    contenido = ruta.read_bytes()
+    analisis = analizar_excel(contenido, parametros)
+    
+    informes = [salida / f"analisis_completo_{ruta.stem}.xlsx"]
+    informes[0].write_bytes(exportar_analisis_completo(analisis.df, analisis.cubo))
+    if analisis.cols['cn'] and 'Stock_Sobrante_Uds' in analisis.df.columns:
+        informes.append(salida / f"CNs_exceso_{ruta.stem}.txt")
+        informes[1].write_text(exportar_cns(analisis.df, analisis.cols), encoding='utf-8')
+    
+    df = analisis.df
+    snapshot = None
+    if historico is not None:
+        snapshot = AlmacenSnapshots(historico).escribir(df, analisis.cols, farmacia or ruta.stem, fecha,
+                                                        CacheIngesta.clave(contenido))
+    return {
+        'archivo': str(ruta),
+        'productos': len(df),
+        'exceso': float(df['Stock_Sobrante'].sum()) if 'Stock_Sobrante' in df else 0.0,
+        'deficit': float(df['Stock_Faltante'].sum()) if 'Stock_Faltante' in df else 0.0,
+        'informes': [str(p) for p in informes],
+        'snapshot': snapshot,
+        'segundos': time.perf_counter() - inicio,
+    }
+
+def ejecutar_lote(archivos: list[Path], parametros: Parametros, salida: Path,
+                  procesos: int | None = None, historico: Path | None = None, fecha: str | None = None,
+                  farmacias: dict[Path, str] | None = None):
+    """Procesa los archivos en un pool de procesos y va devolviendo (ruta, resultado, error)"""
+    salida.mkdir(parents=True, exist_ok=True)
+    almacen = AlmacenSnapshots(historico) if historico is not None else None
+    farmacias = farmacias or {}
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = {pool.submit(procesar_archivo, ruta, parametros, salida, historico, fecha,
+                               farmacias.get(ruta)): ruta
+                   for ruta in archivos}
+        for futuro in as_completed(futuros):
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                yield futuros[futuro], None, e
+                continue
+            # Solo este proceso escribe el índice
+            if almacen is not None:
+                almacen.indexar(resultado['snapshot'])
+            yield futuros[futuro], resultado, None
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m gestion_stock',
+        description="Análisis de stock por lotes sobre exportaciones Excel del ERP")
+    parser.add_argument('entradas', nargs='+', help="Directorios o patrones glob con archivos .xlsx/.xls")
+    parser.add_argument('-p', '--parametros', help="Archivo de parámetros (.toml o .json)")
+    parser.add_argument('-o', '--salida', default='informes', help="Directorio de los informes (por defecto: informes)")
+    parser.add_argument('-j', '--procesos', type=int, default=None,
+                        help="Procesos en paralelo (por defecto: uno por núcleo)")
+    parser.add_argument('--historico', help="Directorio del histórico donde guardar cada análisis como instantánea")
+    parser.add_argument('--fecha', type=date.fromisoformat, default=date.today(),
+                        help="Fecha de las instantáneas, AAAA-MM-DD (por defecto: hoy)")
+    parser.add_argument('--farmacia', action='append', metavar='[ARCHIVO=]NOMBRE',
+                        help="Farmacia de las instantáneas (por defecto: el nombre del archivo sin extensión); "
+                             "NOMBRE con un solo archivo o ARCHIVO=NOMBRE, repetible")
+    args = parser.parse_args(argv)
+    
+    try:
+        parametros = cargar_parametros(args.parametros)
+    except (OSError, ValueError, TypeError, tomllib.TOMLDecodeError) as e:
+        parser.error(str(e))
+    archivos = buscar_excels(args.entradas)
+    if not archivos:
+        parser.error("No se encontró ningún archivo .xlsx o .xls")
+    try:
+        farmacias = asignar_farmacias(archivos, args.farmacia)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    inicio = time.perf_counter()
+    errores = 0
+    for ruta, resultado, error in ejecutar_lote(archivos, parametros, Path(args.salida), args.procesos,
+                                               Path(args.historico) if args.historico else None,
+                                               args.fecha.isoformat(), farmacias):
+        if error is not None:
+            errores += 1
+            print(f"❌ {ruta}: {error}", file=sys.stderr)
+        else:
+            print(f"✅ {ruta}: {resultado['productos']} productos, exceso {formato_euros(resultado['exceso'])}, "
+                  f"déficit {formato_euros(resultado['deficit'])} ({resultado['segundos']:.1f} s)")
+    
+    print(f"{len(archivos) - errores}/{len(archivos)} archivos procesados en "
+          f"{time.perf_counter() - inicio:.1f} s -> {args.salida}")
+    return 1 if errores else 0
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Varias farmacias a la vez: ingesta en paralelo y vista combinada por CN."""
+from concurrent.futures import Executor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .ingesta import ingerir_excel
+from .instrumentacion import medido
+from .tipos import Columnas
+
+# Medidas por CN que se comparan entre farmacias
+MEDIDAS_TIENDA = ['Stock_Actual', 'Stock_Ideal', 'Stock_Sobrante_Uds', 'Stock_Faltante_Uds', 'Total_Ventas']
+
+
+def ingerir_varios(contenidos: dict[str, bytes], pool: Executor | None = None):
+    """Ingiere varios Excel repartidos en un pool de procesos, a medida que terminan.
+    
+    Devuelve (nombre, (df, cols), error) por archivo en orden de finalización. Sin
+    pool, o con un único archivo, se ingiere en el propio proceso y se evita
+    serializar el DataFrame.
+    """
+    if pool is None or len(contenidos) < 2:
+        for nombre, contenido in contenidos.items():
+            try:
+                yield nombre, ingerir_excel(contenido), None
+            except Exception as e:
+                yield nombre, None, e
+        return
+    
+    futuros = {pool.submit(ingerir_excel, contenido): nombre for nombre, contenido in contenidos.items()}
+    for futuro in as_completed(futuros):
+        try:
+            yield futuros[futuro], futuro.result(), None
+        except Exception as e:
+            yield futuros[futuro], None, e
+
+def clave_cn(serie: pd.Series) -> pd.Series:
+    """CN como texto comparable entre archivos (123456, 123456.0 y '123456' coinciden)"""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.round().astype('Int64').astype('string')
+    return serie.astype('string').str.strip()
+
+@medido
+def combinar_tiendas(tiendas: dict[str, tuple[pd.DataFrame, Columnas]]) -> pd.DataFrame:
+    """Tabla por CN con las medidas de cada farmacia (df, cols ya con niveles) en columnas (Medida, Farmacia).
+    
+    Añade el total de cada medida, el número de farmacias que tienen el CN y
+    'Transferible': unidades que sobran en unas farmacias y faltan en otras.
+    Las farmacias sin columna CN no se incluyen.
+    """
+    partes = {}
+    descripciones = []
+    for nombre, (df, cols) in tiendas.items():
+        if not cols['cn']:
+            continue
+        medidas = {'Stock_Actual': df[cols['stock_actual']] if cols['stock_actual'] else 0}
+        medidas.update({m: df[m] for m in MEDIDAS_TIENDA[1:] if m in df.columns})
+        cn = clave_cn(df[cols['cn']])
+        partes[nombre] = pd.DataFrame(medidas, index=df.index).groupby(cn.to_numpy(), dropna=True).sum()
+        if cols['descripcion']:
+            descripciones.append(df[cols['descripcion']].groupby(cn.to_numpy(), dropna=True).first())
+    
+    if not partes:
+        return pd.DataFrame()
+    
+    combinado = pd.concat(partes, axis=1, names=['Farmacia', 'Medida']).swaplevel(axis=1)
+    combinado = combinado[[(m, t) for m in MEDIDAS_TIENDA for t in partes if (m, t) in combinado.columns]]
+    combinado.index.name = 'CN'
+    
+    farmacias = combinado['Stock_Actual'].notna().sum(axis=1)
+    totales = combinado.T.groupby(level='Medida', sort=False).sum().T
+    combinado = pd.concat({medida: pd.concat([combinado[medida], totales[medida].rename('Total')], axis=1)
+                           for medida in totales.columns}, axis=1, names=['Medida', 'Farmacia'])
+    combinado[('Farmacias', '')] = farmacias
+    if 'Stock_Sobrante_Uds' in totales and 'Stock_Faltante_Uds' in totales:
+        combinado[('Transferible', '')] = np.minimum(totales['Stock_Sobrante_Uds'], totales['Stock_Faltante_Uds'])
+    if descripciones:
+        descripcion = pd.concat(descripciones).groupby(level=0).first()
+        combinado.insert(0, ('Descripcion', ''), descripcion.reindex(combinado.index))
+    
+    return combinado
+
+def aplanar_columnas(combinado: pd.DataFrame) -> pd.DataFrame:
+    """Columnas (Medida, Farmacia) como texto plano 'Medida · Farmacia' para mostrar o exportar"""
+    plano = combinado.copy(deep=False)
+    plano.columns = [f"{medida} · {farmacia}" if farmacia else medida for medida, farmacia in combinado.columns]
+    return plano
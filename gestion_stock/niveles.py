@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Etapa 2 del análisis (dependiente de parámetros): niveles de stock y valores."""
+import numpy as np
+import pandas as pd
+
+from .configuracion import CATEGORIAS, NIVELES_STOCK, POLITICAS_STOCK, TIPO_PEDIDO_DEFECTO
+from .instrumentacion import medido
+from .tipos import Columnas
+
+# Columnas que añade calcular_niveles al DataFrame ingerido
+COLUMNAS_NIVELES = ['Vtas_Dia', 'Stock_Min_Calc', 'Stock_Ideal', 'Stock_Limite', 'Valor_Stock_Actual',
+                    'Valor_Stock_Ideal', 'Valor_Stock_Limite', 'Stock_Sobrante_Uds', 'Stock_Sobrante',
+                    'Stock_Faltante_Uds', 'Stock_Faltante', 'Reposicion', 'Indice_Rotacion', 'Valor_Ventas']
+
+
+def redondear(valores, decimales: int = 1) -> np.ndarray:
+    """Redondeo idéntico a round() de Python, calculado una vez por valor distinto"""
+    valores = np.asarray(valores, dtype=float)
+    unicos, inversos = np.unique(valores, return_inverse=True)
+    redondeados = np.array([round(v, decimales) for v in unicos.tolist()], dtype=float)
+    return redondeados[inversos.reshape(valores.shape)]
+
+def matriz_politica(tipo_pedido: str, parametros: dict, margen_seguridad: float) -> dict:
+    """Traduce la política de un tipo de pedido a arrays por categoría.
+    
+    Devuelve {nivel: (dias, unidades, factor)}, cada uno un array con una
+    posición por categoría en el orden de CATEGORIAS.
+    """
+    politica = POLITICAS_STOCK[tipo_pedido]
+    matriz = {}
+    for i, nivel in enumerate(NIVELES_STOCK):
+        reglas = [politica[cat][i] for cat in CATEGORIAS]
+        dias = []
+        for regla in reglas:
+            d = parametros[regla.dias] if isinstance(regla.dias, str) else regla.dias
+            dias.append(min(d, regla.max_dias) if regla.max_dias is not None else d)
+        matriz[nivel] = (
+            np.array(dias, dtype=float),
+            np.array([regla.unidades for regla in reglas], dtype=float),
+            np.array([1 + margen_seguridad if regla.margen else 1 for regla in reglas], dtype=float),
+        )
+    return matriz
+
+def calcular_stocks_por_categoria(df: pd.DataFrame, dias_cobertura_optimo: float, stock_min_dias: float,
+                                  margen_seguridad: float, tipo_pedido: str = TIPO_PEDIDO_DEFECTO) -> pd.DataFrame:
+    """CORRECCIÓN: Cálculo correcto de stocks según categoría y tipo de pedido.
+    
+    Evalúa la matriz de POLITICAS_STOCK indexando por el código de categoría de
+    cada fila, en una sola pasada sobre todo el DataFrame.
+    """
+    parametros = {'dias_cobertura': dias_cobertura_optimo, 'stock_min_dias': stock_min_dias}
+    matriz = matriz_politica(tipo_pedido, parametros, margen_seguridad)
+    
+    # Las categorías desconocidas se tratan como la última (E), igual que antes
+    codigos = pd.Categorical(df['Categoria'], categories=CATEGORIAS).codes
+    codigos = np.where(codigos < 0, len(CATEGORIAS) - 1, codigos)
+    vtas_dia = df['Vtas_Dia'].to_numpy(dtype=float)
+    
+    niveles = {}
+    for nivel, (dias, unidades, factor) in matriz.items():
+        dias_fila = dias[codigos]
+        valor = np.where(dias_fila != 0, vtas_dia * dias_fila, 0.0) + unidades[codigos]
+        niveles[nivel] = redondear(valor * factor[codigos])
+    
+    return pd.DataFrame({
+        'Stock_Min_Calc': niveles['min'],
+        'Stock_Ideal': niveles['ideal'],
+        'Stock_Limite': niveles['limite']
+    }, index=df.index)
+
+@medido(nombre='niveles')
+def calcular_niveles(df_base: pd.DataFrame, cols: Columnas, dias_abierto: float, stock_min_dias: float,
+                     dias_cobertura_optimo: float, margen_seguridad: float,
+                     tipo_pedido: str = TIPO_PEDIDO_DEFECTO) -> pd.DataFrame:
+    """Etapa 2 (dependiente de parámetros): niveles de stock y valores, todo vectorizado.
+    
+    No modifica df_base: trabaja sobre una copia superficial, de modo que el
+    resultado cacheado de la etapa 1 se puede reutilizar entre ejecuciones.
+    """
+    df = df_base.copy(deep=False)
+    # La ingesta guarda cantidades y PVP en el tipo más estrecho (int16, float32...):
+    # los productos se calculan en float64 para no desbordar ni perder precisión
+    ventas = df['Total_Ventas'].to_numpy(dtype=np.float64)
+    
+    # Calcular ventas diarias
+    df['Vtas_Dia'] = ventas / dias_abierto
+    
+    # Calcular stocks según categoría
+    df[['Stock_Min_Calc', 'Stock_Ideal', 'Stock_Limite']] = calcular_stocks_por_categoria(
+        df, dias_cobertura_optimo, stock_min_dias, margen_seguridad, tipo_pedido
+    )
+    
+    # Calcular valores monetarios y excesos/déficits
+    if cols['stock_actual'] and cols['pvp']:
+        stock_actual = df[cols['stock_actual']].astype(np.float64)
+        pvp = df[cols['pvp']].astype(np.float64)
+        
+        df['Valor_Stock_Actual'] = stock_actual * pvp
+        df['Valor_Stock_Ideal'] = df['Stock_Ideal'] * pvp
+        df['Valor_Stock_Limite'] = df['Stock_Limite'] * pvp
+        
+        # CORRECCIÓN: Stock sobrante cuando actual > ideal
+        df['Stock_Sobrante_Uds'] = np.maximum(0, stock_actual - df['Stock_Ideal'])
+        df['Stock_Sobrante'] = df['Stock_Sobrante_Uds'] * pvp
+        
+        # CORRECCIÓN: Stock faltante cuando actual < ideal
+        df['Stock_Faltante_Uds'] = np.maximum(0, df['Stock_Ideal'] - stock_actual)
+        df['Stock_Faltante'] = df['Stock_Faltante_Uds'] * pvp
+        
+        df['Reposicion'] = df['Stock_Ideal'] - stock_actual
+        
+        # Índice de rotación
+        df['Indice_Rotacion'] = np.where(
+            stock_actual > 0,
+            ventas / stock_actual,
+            0
+        ).round(2)
+        
+        df['Valor_Ventas'] = ventas * pvp
+    
+    # Mantener Familia/Subfamilia al final, como en el Excel exportado
+    columnas = [c for c in df.columns if c not in ('Familia', 'Subfamilia')] + ['Familia', 'Subfamilia']
+    return df[columnas]
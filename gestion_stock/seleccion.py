@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Selección de los k mayores (top k) sin ordenar la columna entera."""
+import numpy as np
+import pandas as pd
+
+
+def posiciones_mayores(valores, k: int, filas: np.ndarray | None = None) -> np.ndarray:
+    """Posiciones de los k valores mayores, de mayor a menor.
+    
+    Mismo resultado que un orden estable descendente seguido de head(k) (empates
+    por posición, nulos al final), pero con selección parcial (np.partition) en
+    O(n) y solo los k elegidos se ordenan. filas limita las posiciones candidatas.
+    """
+    numeros = np.asarray(valores, dtype=np.float64)
+    if filas is not None:
+        numeros = numeros[filas]
+    clave = np.where(np.isnan(numeros), -np.inf, numeros)
+    n = len(clave)
+    k = max(min(k, n), 0)
+    if k == 0:
+        return np.empty(0, dtype=np.int64) if filas is None else filas[:0]
+    
+    if k < n:
+        # Umbral del k-ésimo mayor; en la frontera entran los empatados de menor posición
+        umbral = -np.partition(-clave, k - 1)[k - 1]
+        por_encima = np.flatnonzero(clave > umbral)
+        en_umbral = np.flatnonzero(clave == umbral)
+        if umbral == -np.inf:
+            en_umbral = en_umbral[np.argsort(np.isnan(numeros[en_umbral]), kind='stable')]
+        en_umbral = en_umbral[:k - len(por_encima)]
+        elegidas = np.concatenate((por_encima, en_umbral))
+    else:
+        elegidas = np.arange(n)
+    # Nulos detrás de los -inf reales, como en sort_values(na_position='last')
+    orden = np.lexsort((elegidas, np.isnan(numeros[elegidas]), -clave[elegidas]))
+    elegidas = elegidas[orden]
+    return elegidas if filas is None else filas[elegidas]
+
+def mayores(serie: pd.Series, k: int) -> pd.Series:
+    """Los k mayores valores de la serie con su índice (como sort_values(ascending=False).head(k))"""
+    return serie.iloc[posiciones_mayores(serie.to_numpy(dtype=np.float64, na_value=np.nan), k)]
+
+def filas_mayores(df: pd.DataFrame, columna, k: int, filas: np.ndarray | None = None) -> pd.DataFrame:
+    """Las k filas con mayor valor en la columna, de mayor a menor; solo se copian esas k filas"""
+    valores = df[columna].to_numpy(dtype=np.float64, na_value=np.nan)
+    return df.iloc[posiciones_mayores(valores, k, filas)]
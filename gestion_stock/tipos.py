@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Tipos de entrada y salida del núcleo de cálculo."""
+from dataclasses import dataclass
+from typing import TypedDict
+
+from .configuracion import TIPO_PEDIDO_DEFECTO
+
+
+class Columnas(TypedDict):
+    """Columnas del Excel detectadas por detectar_columnas (None si no existen)"""
+    total: str | None
+    stock_actual: str | None
+    pvp: str | None
+    cn: str | None
+    descripcion: str | None
+    categoria_funcional: str | None
+
+
+class InformeLectura(TypedDict):
+    """Motor, formato y duración de la lectura (df.attrs['lectura'])"""
+    motor: str
+    formato: str
+    segundos: float
+
+
+class InformeMemoria(TypedDict):
+    """Memoria del DataFrame ingerido antes y después de compactar (df.attrs['memoria'])"""
+    bytes_antes: int
+    bytes_despues: int
+
+
+@dataclass(frozen=True)
+class Parametros:
+    """Parámetros del cálculo de niveles (los de la barra lateral de la aplicación)"""
+    dias_abierto: int = 300
+    stock_min_dias: int = 10
+    stock_max_dias: int = 20
+    dias_cobertura: int = 15
+    margen_seguridad: float = 0.0
+    tipo_pedido: str = TIPO_PEDIDO_DEFECTO
@@ -2,26 +2,69 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
 import plotly.graph_objects as go
-from io import BytesIO
-from datetime import datetime
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import date, datetime
+from pathlib import Path
+
+from gestion_stock import (CATEGORIAS, POLITICAS_STOCK, TIPO_PEDIDO_DEFECTO, AlmacenSnapshots,
+                           CacheIngesta, CacheLRU, IndiceBusqueda, IndiceFiltros, agregar_cubo,
+                           aplanar_columnas, calcular_niveles, columnas_detalle,
+                           combinar_tiendas, comparar_analisis, construir_cubo, etapa,
+                           exportar_analisis_completo, exportar_cns, exportar_comparativa,
+                           filas_filtradas, filas_mayores, formatear_euros, formato_euros,
+                           formato_numero, huella, huella_contenido, ingerir_varios, mayores, medido,
+                           migraciones_categoria, pagina_detalle, posiciones_mayores,
+                           productos_con_exceso, registrar, resumen_categorias, resumen_diferencias)
 
 st.set_page_config(page_title="Análisis Stock Farmacia", layout="wide")
 
 # ==================== CONFIGURACIÓN Y CONSTANTES ====================
-FAMILIAS_MAP = {
-    'ADELG': 'ADELGAZANTES', 'ANTICEL': 'ANTICELULITICOS', 'AROMA': 'AROMATERAPIA',
-    'DEPORTE': 'DEPORTE', 'DERMO': 'DERMO', 'DIETSOE': 'DIET SOE', 'DIET': 'DIETETICA',
-    'EFECSOE': 'EFEC SOE', 'EFEC': 'EFECTOS', 'EFP': 'EFP', 'ESPEC': 'ESPECIALIDAD',
-    'ESPECSR': 'ESPECIALIDAD', 'FITO': 'FITOTERAPIA', 'HIGBUC': 'HIG.BUCAL',
-    'HIGCAP': 'HIG.CAPILAR', 'HIGCORP': 'HIG.CORPORAL', 'HOMEO': 'HOMEOPATIA',
-    'INFAN': 'INFANTIL', 'INFANSOE': 'INFANTIL SOE', 'INSEC': 'INSECTOS',
-    'NASOI': 'NARIZ OIDOS', 'OPTIC': 'OPTICA', 'ORTO': 'ORTOPEDIA',
-    'ORTOSOE': 'ORTOPEDIA SOE', 'PIEMAN': 'PIES/MANOS', 'GINEC': 'SALUD GINECOLOGICA',
-    'SEX': 'SALUD SEXUAL', 'SOL': 'SOLARES', 'VET': 'VETERINARIA',
-    'VACUNAS': 'VACUNAS', 'FORMULAS': 'FORMULAS', 'ENVASE': 'ENVASE CLINICO'
-}
+# Límites de la caché de ingesta (compartida por todas las sesiones del servidor)
+CACHE_MAX_ENTRADAS = 16
+CACHE_TTL_SEGUNDOS = 4 * 3600
+CACHE_MEMORIA_MB = 1024
+
+# Archivos de descarga generados (se crean solo al pedirlos y se reutilizan)
+CACHE_EXPORT_ENTRADAS = 32
+CACHE_EXPORT_TTL_SEGUNDOS = 3600
+CACHE_EXPORT_MEMORIA_MB = 256
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Instantáneas Parquet de cada análisis, por farmacia y fecha (ver AlmacenSnapshots)
+DIRECTORIO_HISTORICO = os.environ.get('GESTION_STOCK_HISTORICO', str(Path(__file__).parent / 'historico'))
+
+# Figuras de Plotly ya construidas, por contenido de los agregados y opciones de diseño
+CACHE_FIGURAS_ENTRADAS = 64
+CACHE_FIGURAS_MEMORIA_MB = 64
+
+# Filas de los listados "top" (se seleccionan sin ordenar el DataFrame entero)
+FILAS_TOP_EXCESO = 100
+FILAS_TOP_COMPARATIVA = 200
+FILAS_TOP_CAMBIOS = 100
+
+# Índices de búsqueda (por conjunto de archivos) y de filtros (por análisis)
+CACHE_INDICES_ENTRADAS = 16
+CACHE_INDICES_MEMORIA_MB = 512
+
+# Procesos para leer varios archivos a la vez (uno por núcleo)
+PROCESOS_INGESTA = os.cpu_count() or 1
+
+# Modo diagnóstico activado desde el arranque con GESTION_STOCK_DIAGNOSTICO=1
+DIAGNOSTICO_POR_DEFECTO = os.environ.get('GESTION_STOCK_DIAGNOSTICO', '') not in ('', '0')
+
+# Una línea JSON por ejecución con las mediciones del modo diagnóstico
+LOG = logging.getLogger('gestion_stock.app')
+if not LOG.handlers:
+    _manejador = logging.StreamHandler()
+    _manejador.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+    LOG.addHandler(_manejador)
+    LOG.setLevel(logging.INFO)
+    LOG.propagate = False
 
 # ==================== FUNCIONES AUXILIARES ====================
 def aplicar_estilos():
@@ -36,194 +79,252 @@ def aplicar_estilos():
     </style>
     """, unsafe_allow_html=True)
 
-def formato_euros(valor):
-    return f"{valor:,.2f}€".replace(",", "X").replace(".", ",").replace("X", ".")
-
-def formato_numero(valor):
-    return f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-
-def extraer_familia(categoria_str):
-    if pd.isna(categoria_str):
-        return 'SIN CLASIFICAR'
-    
-    # Intentar extraer el prefijo antes del guión
-    partes = str(categoria_str).split('-')
-    if len(partes) > 0:
-        prefijo = partes[0].strip().upper()
-        # Buscar coincidencia exacta o parcial
-        for key, value in FAMILIAS_MAP.items():
-            if prefijo.startswith(key) or key.startswith(prefijo):
-                return value
-    
-    return 'OTROS'
-
-def categorizar_producto(ventas_anuales):
-    if ventas_anuales > 260:
-        return 'A'
-    elif ventas_anuales >= 52:
-        return 'B'
-    elif ventas_anuales >= 12:
-        return 'C'
-    elif ventas_anuales >= 1:
-        return 'D'
-    else:
-        return 'E'
-
-def calcular_stocks_por_categoria(row, dias_cobertura_optimo, stock_min_dias, margen_seguridad):
-    """CORRECCIÓN: Cálculo correcto de stocks según categoría"""
-    cat = row['Categoria']
-    vtas_dia = row['Vtas_Dia']
-    
-    if cat == 'A' or cat == 'B':
-        stock_ideal = vtas_dia * dias_cobertura_optimo
-        stock_min = vtas_dia * stock_min_dias
-        stock_limite = stock_ideal * (1 + margen_seguridad)
-    elif cat == 'C':
-        stock_ideal = 1
-        stock_min = 1
-        stock_limite = 1 * (1 + margen_seguridad)
-    elif cat == 'D':
-        stock_ideal = 1
-        stock_min = 0
-        stock_limite = 1 * (1 + margen_seguridad)
-    else:  # E
-        stock_ideal = 0
-        stock_min = 0
-        stock_limite = 0
-    
-    return pd.Series({
-        'Stock_Min_Calc': round(stock_min, 1),
-        'Stock_Ideal': round(stock_ideal, 1),
-        'Stock_Limite': round(stock_limite, 1)
-    })
+@st.cache_resource
+def obtener_cache_ingesta():
+    """Instancia única de la caché de ingesta para todo el servidor"""
+    return CacheIngesta(CACHE_MAX_ENTRADAS, CACHE_TTL_SEGUNDOS, CACHE_MEMORIA_MB)
 
-def detectar_columnas(df):
-    """Detecta automáticamente las columnas relevantes del DataFrame"""
-    cols = {
-        'total': None, 'stock_actual': None, 'pvp': None, 
-        'cn': None, 'descripcion': None, 'categoria_funcional': None
-    }
-    
-    for col in df.columns:
-        col_lower = str(col).lower()
-        
-        if 'total' in col_lower and 'ventas' not in col_lower and cols['total'] is None:
-            cols['total'] = col
-        elif 'stock' in col_lower and 'actual' in col_lower:
-            cols['stock_actual'] = col
-        elif col_lower == 'pvp':
-            cols['pvp'] = col
-        elif col_lower in ['cn', 'codigo'] or 'idarti' in col_lower:
-            if cols['cn'] is None:
-                cols['cn'] = col
-        elif 'descripcion' in col_lower or 'descripción' in col_lower:
-            cols['descripcion'] = col
-        elif ('categoria' in col_lower and 'funcional' in col_lower) or col_lower in ['categoria', 'categoría']:
-            if cols['categoria_funcional'] is None:
-                cols['categoria_funcional'] = col
-    
-    return cols
-
-def calcular_ventas_totales(df, col_total):
-    """Calcula las ventas totales desde columna TOTAL o sumando meses"""
-    if col_total:
-        return pd.to_numeric(df[col_total], errors='coerce').fillna(0)
-    
-    # Buscar columnas mensuales
-    meses = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
-             'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
-    
-    columnas_ventas = []
-    for col in df.columns:
-        col_lower = str(col).lower()
-        if 'ventas' in col_lower or any(mes in col_lower for mes in meses):
-            columnas_ventas.append(col)
-    
-    if columnas_ventas:
-        return df[columnas_ventas].apply(pd.to_numeric, errors='coerce').fillna(0).sum(axis=1)
-    
-    return pd.Series(0, index=df.index)
+@st.cache_resource
+def obtener_cache_exportaciones():
+    """Archivos de descarga ya generados, por datos, parámetros y tipo de exportación"""
+    return CacheLRU(CACHE_EXPORT_ENTRADAS, CACHE_EXPORT_TTL_SEGUNDOS, CACHE_EXPORT_MEMORIA_MB)
+
+@st.cache_resource
+def obtener_historico():
+    return AlmacenSnapshots(DIRECTORIO_HISTORICO)
+
+@st.cache_resource
+def obtener_cache_indices():
+    return CacheLRU(CACHE_INDICES_ENTRADAS, CACHE_TTL_SEGUNDOS, CACHE_INDICES_MEMORIA_MB)
+
+@st.cache_resource
+def obtener_cache_figuras():
+    return CacheLRU(CACHE_FIGURAS_ENTRADAS, CACHE_TTL_SEGUNDOS, CACHE_FIGURAS_MEMORIA_MB)
+
+def figura_cacheada(construir, *datos, **opciones):
+    """construir(*datos, **opciones) reutilizando la figura mientras no cambien datos ni opciones.
+    
+    La clave es el hash del contenido de los agregados (no su identidad), así que
+    un rerun con los mismos datos no vuelve a crear ni validar los objetos de Plotly.
+    Las figuras guardadas no se modifican después (st.plotly_chart solo las lee).
+    """
+    cache = obtener_cache_figuras()
+    clave = huella_contenido(construir.__name__, *datos, sorted(opciones.items()))
+    figura = cache.obtener(clave)
+    if figura is None:
+        figura = construir(*datos, **opciones)
+        # La figura guarda una copia de los valores de los agregados (más la estructura)
+        tam = sum(np.sum(d.memory_usage(deep=True)) for d in datos if hasattr(d, 'memory_usage'))
+        cache.guardar(clave, figura, int(tam) + 16 * 1024)
+    return figura
+
+def descarga_diferida(etiqueta, icono, tipo, huella_datos, generar, nombre_archivo, mime=None):
+    """Botón de descarga cuyo archivo solo se genera cuando el usuario lo pide.
+    
+    Mientras no cambien los datos ni los parámetros (huella_datos), el archivo
+    generado se sirve desde la caché de exportaciones sin volver a escribirlo.
+    Se llama dentro de fragmentos, así que preparar o descargar no recalcula la página.
+    """
+    cache = obtener_cache_exportaciones()
+    clave = huella(huella_datos, tipo)
+    contenido = cache.obtener(clave)
+    
+    if contenido is None:
+        if not st.button(f"⚙️ Preparar {etiqueta}", use_container_width=True, key=f"preparar_{tipo}"):
+            return
+        with st.spinner(f"Generando {etiqueta}..."):
+            contenido = generar()
+        cache.guardar(clave, contenido, len(contenido))
+    
+    st.download_button(f"{icono} Descargar {etiqueta}", contenido, nombre_archivo, mime=mime,
+                       use_container_width=True, key=f"descargar_{tipo}")
+
+def formato_columnas(euros=(), numeros=()):
+    """column_config de st.dataframe: los valores siguen siendo números (se ordenan bien)
+    y el navegador los muestra con los separadores de su idioma"""
+    config = {col: st.column_config.NumberColumn(format='euro') for col in euros}
+    config.update({col: st.column_config.NumberColumn(format='localized') for col in numeros})
+    return config
+
+def nombres_farmacias(uploaded_files, elegidos=None):
+    """Nombre de farmacia de cada archivo, sin repetir ('centro', 'centro (2)').
+    
+    elegidos son los nombres escritos por el usuario; si falta o está vacío se usa
+    el nombre del archivo sin extensión.
+    """
+    nombres = []
+    for i, archivo in enumerate(uploaded_files):
+        elegido = elegidos[i].strip() if elegidos else ''
+        base = elegido or Path(archivo.name).stem
+        nombre, n = base, 1
+        while nombre in nombres:
+            n += 1
+            nombre = f"{base} ({n})"
+        nombres.append(nombre)
+    return nombres
+
+def elegir_farmacias(uploaded_files):
+    """Nombre editable de la farmacia de cada archivo (por defecto, el del archivo).
+    
+    Es la partición del histórico: como las exportaciones del ERP suelen llevar la
+    fecha en el nombre, hay que dar el mismo nombre en cada inventario para que la
+    evolución y los cambios por CN encuentren las instantáneas anteriores.
+    """
+    conocidas = obtener_historico().farmacias()
+    ayuda = f"Farmacias en el histórico: {', '.join(conocidas)}" if conocidas else None
+    with st.expander("🏪 Nombre de cada farmacia"):
+        elegidos = [st.text_input(archivo.name, value=Path(archivo.name).stem,
+                                  key=f"farmacia_{i}_{archivo.name}", help=ayuda)
+                    for i, archivo in enumerate(uploaded_files)]
+    return nombres_farmacias(uploaded_files, elegidos)
 
 # ==================== FUNCIÓN PRINCIPAL DE PROCESAMIENTO ====================
-def procesar_excel(uploaded_file, dias_abierto, stock_min_dias, stock_max_dias, 
-                   dias_cobertura_optimo, margen_seguridad):
-    """Procesa el Excel y calcula todos los indicadores"""
-    
-    # Leer Excel
-    df = pd.read_excel(uploaded_file)
-    
-    # Detectar columnas
-    cols = detectar_columnas(df)
-    
-    # Calcular ventas totales
-    df['Total_Ventas'] = calcular_ventas_totales(df, cols['total'])
-    
-    # Calcular ventas diarias
-    df['Vtas_Dia'] = df['Total_Ventas'] / dias_abierto
-    
-    # Categorizar productos
-    df['Categoria'] = df['Total_Ventas'].apply(categorizar_producto)
-    
-    # Calcular stocks según categoría
-    df[['Stock_Min_Calc', 'Stock_Ideal', 'Stock_Limite']] = df.apply(
-        lambda row: calcular_stocks_por_categoria(row, dias_cobertura_optimo, stock_min_dias, margen_seguridad),
-        axis=1
-    )
-    
-    # Limpiar y procesar PVP
-    if cols['pvp']:
-        df[cols['pvp']] = df[cols['pvp']].astype(str).str.replace('€', '').str.replace(',', '.').str.strip()
-        df[cols['pvp']] = pd.to_numeric(df[cols['pvp']], errors='coerce').fillna(0)
-    
-    # Procesar stock actual
-    if cols['stock_actual']:
-        df[cols['stock_actual']] = pd.to_numeric(df[cols['stock_actual']], errors='coerce').fillna(0)
-    
-    # Calcular valores monetarios y excesos/déficits
-    if cols['stock_actual'] and cols['pvp']:
-        df['Valor_Stock_Actual'] = df[cols['stock_actual']] * df[cols['pvp']]
-        df['Valor_Stock_Ideal'] = df['Stock_Ideal'] * df[cols['pvp']]
-        df['Valor_Stock_Limite'] = df['Stock_Limite'] * df[cols['pvp']]
-        
-        # CORRECCIÓN: Stock sobrante cuando actual > ideal
-        df['Stock_Sobrante_Uds'] = np.maximum(0, df[cols['stock_actual']] - df['Stock_Ideal'])
-        df['Stock_Sobrante'] = df['Stock_Sobrante_Uds'] * df[cols['pvp']]
-        
-        # CORRECCIÓN: Stock faltante cuando actual < ideal
-        df['Stock_Faltante_Uds'] = np.maximum(0, df['Stock_Ideal'] - df[cols['stock_actual']])
-        df['Stock_Faltante'] = df['Stock_Faltante_Uds'] * df[cols['pvp']]
-        
-        df['Reposicion'] = df['Stock_Ideal'] - df[cols['stock_actual']]
-        
-        # Índice de rotación
-        df['Indice_Rotacion'] = np.where(
-            df[cols['stock_actual']] > 0,
-            df['Total_Ventas'] / df[cols['stock_actual']],
-            0
-        ).round(2)
-        
-        df['Valor_Ventas'] = df['Total_Ventas'] * df[cols['pvp']]
-    
-    # Procesar familias funcionales
-    if cols['categoria_funcional']:
-        df['Familia'] = df[cols['categoria_funcional']].apply(extraer_familia)
-        df['Subfamilia'] = df[cols['categoria_funcional']]
-    else:
-        df['Familia'] = 'SIN CLASIFICAR'
-        df['Subfamilia'] = 'SIN CLASIFICAR'
-    
-    return df, cols
+@medido
+def procesar_excels(uploaded_files, dias_abierto, stock_min_dias, stock_max_dias,
+                    dias_cobertura_optimo, margen_seguridad, tipo_pedido=TIPO_PEDIDO_DEFECTO, farmacias=None):
+    """Procesa varios Excel: los que no están en caché se leen en paralelo.
+    
+    farmacias da el nombre de cada archivo (por defecto, nombres_farmacias).
+    Devuelve {farmacia: (df, cols)} en el orden de subida.
+    """
+    cache = obtener_cache_ingesta()
+    farmacias = farmacias or nombres_farmacias(uploaded_files)
+    contenidos = {nombre: archivo.getvalue() for nombre, archivo in zip(farmacias, uploaded_files)}
+    claves = {nombre: cache.clave(contenido) for nombre, contenido in contenidos.items()}
+    
+    ingeridos = {nombre: cache.obtener(clave) for nombre, clave in claves.items()}
+    pendientes = {nombre: contenidos[nombre] for nombre, resultado in ingeridos.items() if resultado is None}
+    
+    if pendientes:
+        progreso = st.progress(0.0, text=f"Leyendo {len(pendientes)} archivo(s)...")
+        errores = []
+        # 'spawn' porque el servidor de Streamlit tiene varios hilos activos; con un solo
+        # proceso disponible el pool solo añadiría coste y se lee aquí mismo
+        procesos = min(PROCESOS_INGESTA, len(pendientes))
+        with (ProcessPoolExecutor(procesos, mp_context=multiprocessing.get_context('spawn'))
+              if procesos > 1 else nullcontext()) as pool:
+            for i, (nombre, resultado, error) in enumerate(ingerir_varios(pendientes, pool), start=1):
+                if error is not None:
+                    errores.append((nombre, error))
+                else:
+                    ingeridos[nombre] = resultado
+                    cache.guardar(claves[nombre], resultado, int(resultado[0].memory_usage(deep=True).sum()))
+                progreso.progress(i / len(pendientes), text=f"Leído {nombre} ({i}/{len(pendientes)})")
+        progreso.empty()
+        if len(errores) == len(contenidos):
+            if len(errores) == 1:
+                raise errores[0][1]
+            raise ValueError(" | ".join(f"{nombre}: {error}" for nombre, error in errores))
+        for nombre, error in errores:
+            st.error(f"❌ Error en {nombre}: {error}")
+    
+    resultados = {}
+    for nombre, resultado in ingeridos.items():
+        if resultado is None:
+            continue
+        df = calcular_niveles(resultado[0], resultado[1], dias_abierto, stock_min_dias,
+                              dias_cobertura_optimo, margen_seguridad, tipo_pedido)
+        # Identifica los datos (índice de búsqueda) y datos y parámetros (exportaciones)
+        df.attrs['origen'] = claves[nombre]
+        df.attrs['huella'] = huella(claves[nombre], dias_abierto, stock_min_dias,
+                                    dias_cobertura_optimo, margen_seguridad, tipo_pedido)
+        resultados[nombre] = (df, resultado[1])
+    return resultados
+
+@medido
+def guardar_historico(resultados, fecha):
+    """Guarda los datos de cada farmacia como instantánea del día.
+    
+    La clave es el contenido del Excel, no los parámetros: mover los sliders no reescribe nada.
+    """
+    historico = obtener_historico()
+    for farmacia, (df, cols) in resultados.items():
+        try:
+            historico.guardar(df, cols, farmacia, fecha, df.attrs['origen'])
+        except OSError as e:
+            st.warning(f"⚠️ No se pudo guardar {farmacia} en el histórico: {e}")
+
+@medido
+def cargar_snapshot(farmacia, fecha, dias_abierto, stock_min_dias, dias_cobertura_optimo,
+                    margen_seguridad, tipo_pedido=TIPO_PEDIDO_DEFECTO):
+    """Análisis desde una instantánea del histórico, sin volver a leer el Excel.
+    
+    Los niveles se recalculan con los parámetros actuales.
+    """
+    historico = obtener_historico()
+    entrada = historico.entrada(farmacia, fecha)
+    df, cols = historico.cargar(farmacia, fecha)
+    df = calcular_niveles(df, cols, dias_abierto, stock_min_dias, dias_cobertura_optimo,
+                          margen_seguridad, tipo_pedido)
+    df.attrs['origen'] = huella(entrada['ruta'], entrada['guardado'])
+    df.attrs['huella'] = huella(df.attrs['origen'], dias_abierto, stock_min_dias,
+                                dias_cobertura_optimo, margen_seguridad, tipo_pedido)
+    return {farmacia: (df, cols)}
+
+# ==================== GRÁFICOS ====================
+# Solo dependen de los agregados que reciben: se memorizan con figura_cacheada
+
+def figura_categorias(productos, titulo="Proporción de Productos por Categoría", altura=400):
+    """Anillo con el número de productos por categoría A-E"""
+    colores = ['#667eea', '#764ba2', '#f093fb', '#4facfe', '#43e97b']
+    fig = go.Figure(data=[go.Pie(
+        labels=CATEGORIAS,
+        values=productos.values,
+        hole=0.4,
+        marker=dict(colors=colores),
+        textinfo='label+percent',
+        sort=False
+    )])
+    fig.update_layout(title=titulo, height=altura)
+    return fig
+
+def figura_comparativa_stock(niveles, titulo='Comparativa Stock', altura=350):
+    """Barras agrupadas de stock actual, ideal y límite por categoría"""
+    fig = go.Figure()
+    fig.add_trace(go.Bar(name='Stock Actual', x=CATEGORIAS,
+                         y=niveles['Stock_Actual'].values, marker_color='#4169E1'))
+    fig.add_trace(go.Bar(name='Stock Ideal', x=CATEGORIAS,
+                         y=niveles['Stock_Ideal'].values, marker_color='#FFD700'))
+    fig.add_trace(go.Bar(name='Stock Límite', x=CATEGORIAS,
+                         y=niveles['Stock_Limite'].values, marker_color='#FF6347'))
+    fig.update_layout(title=titulo, barmode='group', yaxis_title='Unidades', height=altura)
+    return fig
+
+def figura_top_exceso(top_exceso, titulo="Top 15 Familias - Exceso de Stock", altura=500):
+    """Barras horizontales con el valor del exceso de cada familia"""
+    fig = go.Figure(data=[go.Bar(
+        x=top_exceso.values, y=top_exceso.index, orientation='h',
+        marker=dict(color=top_exceso.values, colorscale='Reds'),
+        text=formatear_euros(top_exceso).tolist(),
+        textposition='auto'
+    )])
+    fig.update_layout(title=titulo, xaxis_title="Valor Exceso (€)", height=altura)
+    return fig
+
+def figura_evolucion(tendencia, altura=350):
+    """Líneas del valor de stock, exceso y déficit de cada instantánea"""
+    series = {'valor_stock': ('Valor Stock', '#4169E1'), 'exceso': ('Exceso', '#FF6347'),
+              'deficit': ('Déficit', '#FFD700')}
+    fig = go.Figure()
+    for columna, (nombre, color) in series.items():
+        if columna in tendencia:
+            fig.add_trace(go.Scatter(name=nombre, x=tendencia.index, y=tendencia[columna],
+                                     mode='lines+markers', line_color=color))
+    fig.update_layout(yaxis_title='€', height=altura)
+    return fig
 
 # ==================== COMPONENTES DE VISUALIZACIÓN ====================
-def mostrar_resumen_ejecutivo(df, col_stock_actual):
+@medido
+def mostrar_resumen_ejecutivo(cubo):
     """Muestra el resumen ejecutivo con métricas principales"""
     with st.expander("📊 Resumen Ejecutivo", expanded=True):
         col1, col2, col3, col4 = st.columns(4)
         
-        total_inversion = df['Valor_Stock_Actual'].sum()
-        total_ideal = df['Valor_Stock_Ideal'].sum()
-        total_sobrante = df['Stock_Sobrante'].sum()
-        total_faltante = df['Stock_Faltante'].sum()
+        totales = agregar_cubo(cubo).iloc[0]
+        total_inversion = totales['Valor_Stock_Actual']
+        total_ideal = totales['Valor_Stock_Ideal']
+        total_sobrante = totales['Stock_Sobrante']
+        total_faltante = totales['Stock_Faltante']
         
         with col1:
             st.metric("Inversión Total en Stock", formato_euros(total_inversion))
@@ -246,7 +347,8 @@ def mostrar_resumen_ejecutivo(df, col_stock_actual):
         elif total_faltante > total_sobrante:
             st.info(f"📈 **Oportunidad de optimización**: Déficit de {formato_euros(total_faltante - total_sobrante)}")
 
-def grafico_distribucion_categorias(df, cols):
+@medido
+def grafico_distribucion_categorias(df, cols, cubo):
     """Gráfico de distribución por categorías de rotación"""
     st.subheader("📈 Clasificación por Velocidad de Rotación")
     st.caption("Distribución de productos según su frecuencia de venta anual")
@@ -254,58 +356,42 @@ def grafico_distribucion_categorias(df, cols):
     col1, col2 = st.columns([1, 1])
     
     with col1:
-        categorias_ordenadas = ['A', 'B', 'C', 'D', 'E']
-        colores = ['#667eea', '#764ba2', '#f093fb', '#4facfe', '#43e97b']
-        
-        categoria_counts = df['Categoria'].value_counts().reindex(categorias_ordenadas, fill_value=0)
-        
-        fig_pie = go.Figure(data=[go.Pie(
-            labels=categorias_ordenadas,
-            values=categoria_counts.values,
-            hole=0.4,
-            marker=dict(colors=colores),
-            textinfo='label+percent',
-            sort=False
-        )])
-        
-        fig_pie.update_layout(title="Proporción de Productos por Categoría", height=400)
-        st.plotly_chart(fig_pie, use_container_width=True)
+        resumen = resumen_categorias(cubo)
+        fig_pie = figura_cacheada(figura_categorias, resumen['Filas'])
+        with etapa('plotly_chart'):
+            st.plotly_chart(fig_pie, use_container_width=True)
     
     with col2:
-        resumen = df.groupby('Categoria').agg({
-            'Total_Ventas': 'sum',
-            'Valor_Stock_Actual': 'sum',
-            'Stock_Sobrante': 'sum'
-        }).reindex(categorias_ordenadas, fill_value=0)
-        
         resumen_display = pd.DataFrame({
             'Cat.': resumen.index,
-            'Ventas Anuales': resumen['Total_Ventas'].apply(formato_numero),
-            'Inversión Stock': resumen['Valor_Stock_Actual'].apply(formato_euros),
-            'Exceso Stock': resumen['Stock_Sobrante'].apply(formato_euros)
+            'Ventas Anuales': resumen['Total_Ventas'],
+            'Inversión Stock': resumen['Valor_Stock_Actual'],
+            'Exceso Stock': resumen['Stock_Sobrante']
         })
         
-        st.dataframe(resumen_display, use_container_width=True, height=250, hide_index=True)
+        st.dataframe(resumen_display, use_container_width=True, height=250, hide_index=True,
+                     column_config=formato_columnas(euros=['Inversión Stock', 'Exceso Stock'],
+                                                    numeros=['Ventas Anuales']))
         
         # Botón CNs sobrantes
         mostrar_cns_sobrantes(df, cols)
 
+@medido
+@st.fragment
 def mostrar_cns_sobrantes(df, cols):
-    """Muestra productos con exceso de stock con toggle"""
-    productos_sobrantes = df[df['Stock_Sobrante_Uds'] > 0].copy()
+    """Muestra productos con exceso de stock con toggle.
     
-    if len(productos_sobrantes) > 0 and cols['cn']:
-        mostrar = st.session_state.get('mostrar_cns_sobrante', False)
-        
-        boton_texto = "🔽 Ocultar CNs" if mostrar else f"👁️ Ver CNs con Exceso ({len(productos_sobrantes)})"
-        
-        if st.button(boton_texto, use_container_width=True, key="btn_cns"):
-            st.session_state.mostrar_cns_sobrante = not mostrar
-            st.rerun()
+    Es un fragmento: el toggle y los botones de descarga solo vuelven a ejecutar
+    esta sección, no la página entera.
+    """
+    n_sobrantes = int((df['Stock_Sobrante_Uds'] > 0).sum())
+    
+    if n_sobrantes > 0 and cols['cn']:
+        mostrar = st.toggle(f"👁️ Ver CNs con Exceso ({n_sobrantes})", key='mostrar_cns_sobrante')
         
         if mostrar:
-            productos_sobrantes = productos_sobrantes.sort_values('Stock_Sobrante', ascending=False)
-            
+            # Solo los 100 primeros: selección parcial, sin ordenar todos los productos con exceso
+            productos_sobrantes = productos_con_exceso(df, limite=FILAS_TOP_EXCESO)
             st.markdown("#### 📋 Productos con Exceso de Stock")
             
             display_cols = [cols['cn'], 'Categoria', cols['stock_actual'], 
@@ -313,22 +399,22 @@ def mostrar_cns_sobrantes(df, cols):
             if cols['descripcion']:
                 display_cols.insert(1, cols['descripcion'])
             
-            cns_display = productos_sobrantes[display_cols].head(100).copy()
-            cns_display['Stock_Sobrante'] = cns_display['Stock_Sobrante'].apply(formato_euros)
+            cns_display = productos_sobrantes[display_cols]
             
-            st.dataframe(cns_display, use_container_width=True, height=400, hide_index=True)
+            st.dataframe(cns_display, use_container_width=True, height=400, hide_index=True,
+                         column_config=formato_columnas(euros=['Stock_Sobrante']))
             
             # Botones descarga
             col_btn1, col_btn2 = st.columns(2)
             with col_btn1:
-                cns_txt = "\n".join(productos_sobrantes[cols['cn']].astype(str).tolist())
-                st.download_button(
-                    "📄 Descargar CNs (TXT)", cns_txt,
-                    f"CNs_exceso_{datetime.now().strftime('%Y%m%d_%H%M')}.txt",
-                    use_container_width=True
+                descarga_diferida(
+                    "CNs (TXT)", "📄", 'cns_exceso', df.attrs['huella'],
+                    lambda: exportar_cns(df, cols).encode('utf-8'),
+                    f"CNs_exceso_{datetime.now().strftime('%Y%m%d_%H%M')}.txt", mime="text/plain"
                 )
 
-def grafico_comparativa_stock(df, cols):
+@medido
+def grafico_comparativa_stock(cubo, cols):
     """Gráfico comparativo Stock Actual vs Ideal vs Límite"""
     st.subheader("🎯 Comparativa Stock: Actual vs Ideal vs Límite")
     
@@ -339,100 +425,199 @@ def grafico_comparativa_stock(df, cols):
     col1, col2 = st.columns([1, 1])
     
     with col1:
-        analisis = df.groupby('Categoria').agg({
-            cols['cn']: 'count',
-            cols['stock_actual']: 'sum',
-            'Stock_Ideal': 'sum',
-            'Stock_Limite': 'sum',
-            'Stock_Sobrante_Uds': 'sum',
-            'Stock_Faltante_Uds': 'sum',
-            'Valor_Stock_Actual': 'sum',
-            'Stock_Sobrante': 'sum',
-            'Stock_Faltante': 'sum'
-        }).reindex(['A', 'B', 'C', 'D', 'E'], fill_value=0)
+        analisis = resumen_categorias(cubo)
         
         display_df = pd.DataFrame({
             'Cat.': analisis.index,
-            'Refs': analisis[cols['cn']].astype(int),
-            'Stock Actual': analisis[cols['stock_actual']].round(0).astype(int),
+            'Refs': analisis['Refs'].astype(int),
+            'Stock Actual': analisis['Stock_Actual'].round(0).astype(int),
             'Stock Ideal': analisis['Stock_Ideal'].round(0).astype(int),
             'Exceso (uds)': analisis['Stock_Sobrante_Uds'].round(0).astype(int),
             'Déficit (uds)': analisis['Stock_Faltante_Uds'].round(0).astype(int),
-            'Valor Exceso': analisis['Stock_Sobrante'].apply(formato_euros),
-            'Valor Déficit': analisis['Stock_Faltante'].apply(formato_euros)
+            'Valor Exceso': analisis['Stock_Sobrante'],
+            'Valor Déficit': analisis['Stock_Faltante']
         })
         
-        st.dataframe(display_df, use_container_width=True, height=250, hide_index=True)
+        st.dataframe(display_df, use_container_width=True, height=250, hide_index=True,
+                     column_config=formato_columnas(euros=['Valor Exceso', 'Valor Déficit']))
     
     with col2:
-        categorias = ['A', 'B', 'C', 'D', 'E']
-        
-        fig = go.Figure()
-        fig.add_trace(go.Bar(name='Stock Actual', x=categorias, 
-                            y=analisis[cols['stock_actual']].values, marker_color='#4169E1'))
-        fig.add_trace(go.Bar(name='Stock Ideal', x=categorias,
-                            y=analisis['Stock_Ideal'].values, marker_color='#FFD700'))
-        fig.add_trace(go.Bar(name='Stock Límite', x=categorias,
-                            y=analisis['Stock_Limite'].values, marker_color='#FF6347'))
-        
-        fig.update_layout(title='Comparativa Stock', barmode='group',
-                         yaxis_title='Unidades', height=350)
-        st.plotly_chart(fig, use_container_width=True)
+        fig = figura_cacheada(figura_comparativa_stock, analisis[['Stock_Actual', 'Stock_Ideal', 'Stock_Limite']])
+        with etapa('plotly_chart'):
+            st.plotly_chart(fig, use_container_width=True)
 
-def analisis_familias(df, cols):
+@medido
+def analisis_familias(cubo, cols):
     """Análisis por familias funcionales"""
-    if 'Familia' not in df.columns or cols['cn'] is None:
+    if cols['cn'] is None:
         st.info("ℹ️ No se detectaron familias funcionales")
         return
     
     st.markdown("---")
     st.subheader("🏪 Análisis por Familias Terapéuticas")
     
-    familias_unicas = sorted(df['Familia'].unique().tolist())
-    
     # Mostrar tabla resumen
-    analisis = df.groupby('Familia').agg({
-        cols['cn']: 'count',
-        cols['stock_actual']: 'sum',
-        'Valor_Stock_Actual': 'sum',
-        'Stock_Sobrante': 'sum',
-        'Stock_Faltante': 'sum',
-        'Total_Ventas': 'sum',
-        'Indice_Rotacion': 'mean'
-    }).sort_values('Valor_Stock_Actual', ascending=False)
+    analisis = agregar_cubo(cubo, 'Familia').sort_values('Valor_Stock_Actual', ascending=False)
     
     display_df = pd.DataFrame({
         'Familia': analisis.index,
-        'Nº Refs': analisis[cols['cn']].astype(int),
-        'Stock (uds)': analisis[cols['stock_actual']].round(0).astype(int),
-        'Inversión': analisis['Valor_Stock_Actual'].apply(formato_euros),
-        'Exceso': analisis['Stock_Sobrante'].apply(formato_euros),
-        'Déficit': analisis['Stock_Faltante'].apply(formato_euros),
+        'Nº Refs': analisis['Refs'].astype(int),
+        'Stock (uds)': analisis['Stock_Actual'].round(0).astype(int),
+        'Inversión': analisis['Valor_Stock_Actual'],
+        'Exceso': analisis['Stock_Sobrante'],
+        'Déficit': analisis['Stock_Faltante'],
         'Ventas (uds)': analisis['Total_Ventas'].round(0).astype(int),
-        'IR Medio': analisis['Indice_Rotacion'].round(2)
+        'IR Medio': analisis['IR_Medio'].round(2)
     })
     
-    st.dataframe(display_df, use_container_width=True, height=400, hide_index=True)
+    st.dataframe(display_df, use_container_width=True, height=400, hide_index=True,
+                 column_config=formato_columnas(euros=['Inversión', 'Exceso', 'Déficit']))
     
     # Gráfico top familias con exceso
     st.markdown("---")
     st.subheader("🚨 Top Familias con Mayor Exceso")
     
-    top_exceso = df.groupby('Familia')['Stock_Sobrante'].sum().sort_values(ascending=False).head(15)
+    top_exceso = mayores(analisis['Stock_Sobrante'], 15)
     
     if top_exceso.sum() > 0:
-        fig = go.Figure(data=[go.Bar(
-            x=top_exceso.values, y=top_exceso.index, orientation='h',
-            marker=dict(color=top_exceso.values, colorscale='Reds'),
-            text=[formato_euros(v) for v in top_exceso.values],
-            textposition='auto'
-        )])
-        
-        fig.update_layout(title="Top 15 Familias - Exceso de Stock",
-                         xaxis_title="Valor Exceso (€)", height=500)
-        st.plotly_chart(fig, use_container_width=True)
+        fig = figura_cacheada(figura_top_exceso, top_exceso)
+        with etapa('plotly_chart'):
+            st.plotly_chart(fig, use_container_width=True)
+
+def obtener_indice_busqueda(resultados):
+    """Índice de búsqueda sobre los productos de todas las farmacias, en el orden de resultados"""
+    cache = obtener_cache_indices()
+    clave = huella(*(df.attrs['origen'] for df, _ in resultados.values()), 'busqueda')
+    indice = cache.obtener(clave)
+    if indice is None:
+        cns = [df[cols['cn']] if cols['cn'] else pd.Series(pd.NA, index=df.index, dtype='string')
+               for df, cols in resultados.values()]
+        descripciones = [df[cols['descripcion']] if cols['descripcion'] else pd.Series('', index=df.index)
+                         for df, cols in resultados.values()]
+        indice = IndiceBusqueda(pd.concat(cns, ignore_index=True), pd.concat(descripciones, ignore_index=True))
+        cache.guardar(clave, indice, indice.memoria())
+    return indice
+
+def obtener_indice_filtros(df):
+    """Mapas de bits de Categoria, Familia y Subfamilia, compartidos entre secciones y reruns.
+    
+    Esas columnas salen de la ingesta, no de los parámetros: la clave es el origen de los
+    datos, así que mover los sliders no reconstruye el índice ni llena la caché.
+    """
+    cache = obtener_cache_indices()
+    clave = huella(df.attrs['origen'], 'filtros')
+    indice = cache.obtener(clave)
+    if indice is None:
+        indice = IndiceFiltros(df)
+        cache.guardar(clave, indice, indice.memoria())
+    return indice
+
+@medido
+@st.fragment
+def mostrar_busqueda(resultados):
+    """Buscador de productos por CN o descripción en todas las farmacias cargadas (fragmento)"""
+    consulta = st.text_input("🔎 Buscar producto", key='busqueda',
+                             placeholder="CN o descripción (sin importar acentos ni mayúsculas)")
+    if not consulta.strip():
+        return
+    
+    filas, _ = obtener_indice_busqueda(resultados).buscar(consulta)
+    if not len(filas):
+        st.info("ℹ️ Ningún producto coincide con la búsqueda")
+        return
+    
+    # Fila global -> (farmacia, fila dentro de su DataFrame)
+    nombres = list(resultados)
+    limites = np.cumsum([0] + [len(df) for df, _ in resultados.values()])
+    encontrados = []
+    for fila in filas:
+        tienda = int(np.searchsorted(limites, fila, side='right')) - 1
+        df, cols = resultados[nombres[tienda]]
+        producto = df.iloc[fila - limites[tienda]]
+        encontrados.append({
+            'Farmacia': nombres[tienda],
+            'CN': producto[cols['cn']] if cols['cn'] else None,
+            'Descripción': producto[cols['descripcion']] if cols['descripcion'] else None,
+            'Categoría': producto['Categoria'],
+            'Familia': producto['Familia'],
+            'Stock': producto[cols['stock_actual']] if cols['stock_actual'] else None,
+            'Stock Ideal': producto['Stock_Ideal'],
+            'Exceso (uds)': producto.get('Stock_Sobrante_Uds'),
+            'Déficit (uds)': producto.get('Stock_Faltante_Uds'),
+            'Exceso': producto.get('Stock_Sobrante'),
+            'Déficit': producto.get('Stock_Faltante'),
+        })
+    tabla = pd.DataFrame(encontrados)
+    if len(resultados) == 1:
+        tabla = tabla.drop(columns='Farmacia')
+    
+    elegido = st.selectbox("Producto", range(len(tabla)), key='busqueda_producto',
+                           format_func=lambda i: f"{tabla['CN'].iloc[i]} · {tabla['Descripción'].iloc[i]}")
+    producto = tabla.iloc[elegido]
+    col1, col2, col3, col4 = st.columns(4)
+    # Sin columna de stock en el Excel (o sin valor en la fila) no hay stock que mostrar
+    col1.metric("Stock actual", formato_numero(producto['Stock']) if pd.notna(producto['Stock']) else "—")
+    col2.metric("Stock ideal", formato_numero(producto['Stock Ideal']))
+    if pd.notna(producto['Exceso']):
+        col3.metric("Exceso", formato_euros(producto['Exceso']), f"{formato_numero(producto['Exceso (uds)'])} uds",
+                    delta_color='inverse')
+        col4.metric("Déficit", formato_euros(producto['Déficit']), f"{formato_numero(producto['Déficit (uds)'])} uds",
+                    delta_color='off')
+    
+    st.dataframe(tabla.round(2), use_container_width=True, hide_index=True,
+                 column_config=formato_columnas(euros=['Exceso', 'Déficit']))
+
+@medido
+@st.fragment
+def mostrar_detalle_productos(df, cols):
+    """Detalle de productos por páginas (fragmento).
+    
+    Filtros, orden y corte se hacen sobre el DataFrame procesado en el servidor;
+    al navegador solo llega la página visible.
+    """
+    st.markdown("---")
+    columnas = columnas_detalle(df, cols)
+    indice = obtener_indice_filtros(df)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        categorias = st.multiselect("Categorías", CATEGORIAS, key='detalle_categorias')
+    with col2:
+        familias = st.multiselect("Familias", indice.valores('Familia'), key='detalle_familias')
+    with col3:
+        subfamilias = st.multiselect("Subfamilias", indice.valores('Subfamilia', {'Familia': familias}),
+                                     key='detalle_subfamilias')
+    
+    filtros = {'Categoria': categorias, 'Familia': familias, 'Subfamilia': subfamilias}
+    filas = filas_filtradas(df, filtros, indice) if any(filtros.values()) else None
+    total = len(df) if filas is None else len(filas)
+    st.subheader(f"📋 Detalle de Productos ({total:,} productos)".replace(",", "."))
+    
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        orden_defecto = 'Valor_Stock_Actual' if 'Valor_Stock_Actual' in columnas else columnas[0]
+        orden = st.selectbox("Ordenar por", columnas, index=columnas.index(orden_defecto), key='detalle_orden')
+    with col2:
+        descendente = st.toggle("Descendente", value=True, key='detalle_descendente')
+    with col3:
+        filas_por_pagina = st.selectbox("Filas por página", [25, 50, 100, 200], index=1, key='detalle_filas')
+    paginas = max(1, -(-total // filas_por_pagina))
+    # Al filtrar o agrandar las páginas puede sobrar la página elegida
+    if st.session_state.get('detalle_pagina', 1) > paginas:
+        st.session_state['detalle_pagina'] = paginas
+    with col4:
+        pagina = st.number_input(f"Página (de {paginas})", 1, paginas, key='detalle_pagina')
+    
+    vista, total = pagina_detalle(df, columnas, pagina - 1, filas_por_pagina, orden, not descendente, filas)
+    st.dataframe(vista, use_container_width=True, hide_index=True,
+                 column_config=formato_columnas(euros=['Valor_Stock_Actual', 'Stock_Sobrante', 'Stock_Faltante']))
+    if total:
+        inicio = (pagina - 1) * filas_por_pagina
+        st.caption(f"Filas {inicio + 1:,}–{min(inicio + filas_por_pagina, total):,} de {total:,}".replace(",", "."))
 
-def botones_exportacion(df, cols):
+@medido
+@st.fragment
+def botones_exportacion(df, cols, cubo):
     """Botones para exportar informes"""
     st.markdown("---")
     st.subheader("📥 Exportación de Informes")
@@ -440,20 +625,176 @@ def botones_exportacion(df, cols):
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Datos Completos', index=False)
-        output.seek(0)
-        
-        st.download_button(
-            "📊 Análisis Completo", output,
-            f"analisis_completo_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True
+        descarga_diferida(
+            "Análisis Completo", "📊", 'analisis_completo', df.attrs['huella'],
+            lambda: exportar_analisis_completo(df, cubo),
+            f"analisis_completo_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx", mime=MIME_XLSX
         )
 
+@medido
+@st.fragment
+def mostrar_comparativa_farmacias(resultados):
+    """Resumen por farmacia y tabla combinada por CN de todos los archivos subidos (fragmento)"""
+    st.subheader("🏬 Comparativa entre Farmacias")
+    
+    resumen = pd.DataFrame([{
+        'Farmacia': nombre,
+        'Productos': len(df),
+        'Inversión': df['Valor_Stock_Actual'].sum() if 'Valor_Stock_Actual' in df else None,
+        'Exceso': df['Stock_Sobrante'].sum() if 'Stock_Sobrante' in df else None,
+        'Déficit': df['Stock_Faltante'].sum() if 'Stock_Faltante' in df else None,
+    } for nombre, (df, cols) in resultados.items()])
+    st.dataframe(resumen, use_container_width=True, hide_index=True,
+                 column_config=formato_columnas(euros=['Inversión', 'Exceso', 'Déficit']))
+    
+    combinado = combinar_tiendas(resultados)
+    if combinado.empty:
+        st.info("ℹ️ Ningún archivo tiene columna de código de artículo (CN)")
+        return
+    
+    st.markdown("#### 🔁 Productos por CN en todas las farmacias")
+    st.caption("'Transferible': unidades que sobran en unas farmacias y faltan en otras")
+    orden = 'Transferible' if 'Transferible' in combinado else 'Farmacias'
+    tabla = filas_mayores(combinado, (orden, ''), FILAS_TOP_COMPARATIVA)
+    st.dataframe(aplanar_columnas(tabla), use_container_width=True, height=400)
+    
+    descarga_diferida(
+        "Comparativa por CN", "📊", 'comparativa_cn',
+        huella(*(df.attrs['huella'] for df, _ in resultados.values())),
+        lambda: exportar_comparativa(combinado.sort_values((orden, ''), ascending=False, kind='stable')),
+        f"comparativa_farmacias_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx", mime=MIME_XLSX
+    )
+
+@medido
+def mostrar_evolucion(farmacia):
+    """Evolución del valor de stock, exceso y déficit entre instantáneas (solo lee el índice)"""
+    tendencia = obtener_historico().tendencia(farmacia)
+    if len(tendencia) < 2:
+        return
+    
+    st.subheader("📈 Evolución histórica")
+    fig = figura_cacheada(figura_evolucion, tendencia)
+    with etapa('plotly_chart'):
+        st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"{len(tendencia)} instantáneas de {farmacia} en {DIRECTORIO_HISTORICO}")
+
+@medido
+@st.fragment
+def mostrar_cambios(farmacia, df, cols, fecha, dias_abierto, stock_min_dias, dias_cobertura_optimo,
+                    margen_seguridad, tipo_pedido):
+    """Cambios por CN respecto a otra instantánea de la farmacia, con los parámetros actuales.
+    
+    Es un fragmento: elegir otra fecha solo vuelve a ejecutar esta sección.
+    """
+    indice = obtener_historico().listar(farmacia)
+    if indice.empty or not cols['cn']:
+        return
+    fechas = sorted((f for f in indice['fecha'].dt.date if f != fecha), reverse=True)
+    if not fechas:
+        return
+    
+    st.subheader("🔁 Cambios por CN")
+    fecha_anterior = st.selectbox("Comparar con la instantánea del", fechas, format_func=lambda f: f"{f:%d/%m/%Y}")
+    anterior = cargar_snapshot(farmacia, fecha_anterior, dias_abierto, stock_min_dias, dias_cobertura_optimo,
+                               margen_seguridad, tipo_pedido)[farmacia]
+    diferencias = comparar_analisis(anterior, (df, cols))
+    resumen = resumen_diferencias(diferencias)
+    
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Nuevos", int(resumen['Nuevos'].sum()))
+    col2.metric("Retirados", int(resumen['Retirados'].sum()))
+    col3.metric("Cambian de categoría", int(resumen['Cambian_Categoria'].sum()))
+    if 'Delta_Stock_Sobrante' in resumen:
+        col4.metric("Δ Exceso", formato_euros(resumen['Delta_Stock_Sobrante'].sum()))
+        col5.metric("Δ Déficit", formato_euros(resumen['Delta_Stock_Faltante'].sum()))
+    
+    tab1, tab2, tab3 = st.tabs(["Migraciones de categoría", "Por familia", "CNs con más cambio"])
+    with tab1:
+        st.dataframe(migraciones_categoria(diferencias), use_container_width=True)
+        st.caption("Filas: categoría en la instantánea anterior · Columnas: categoría ahora")
+    formatos = formato_columnas(euros=[c for c in diferencias.columns if 'Sobrante' in c or 'Faltante' in c],
+                                numeros=['Stock_Anterior', 'Stock_Actual', 'Delta_Stock'])
+    with tab2:
+        st.dataframe(resumen_diferencias(diferencias, 'Familia'), use_container_width=True, column_config=formatos)
+    with tab3:
+        delta = 'Delta_Stock_Sobrante' if 'Delta_Stock_Sobrante' in diferencias else 'Delta_Stock'
+        if delta in diferencias:
+            cambios = diferencias.iloc[posiciones_mayores(diferencias[delta].abs(), FILAS_TOP_CAMBIOS)]
+            st.dataframe(cambios, use_container_width=True, height=400, column_config=formatos)
+
+def mostrar_opciones_historico():
+    """Fecha del inventario, guardado automático y apertura de instantáneas en la barra lateral.
+    
+    Devuelve (fecha, ¿guardar?, (farmacia, fecha) de la instantánea elegida o None).
+    """
+    with st.sidebar.expander("📚 Histórico"):
+        fecha = st.date_input("Fecha del inventario", value=date.today(), format="DD/MM/YYYY")
+        guardar = st.checkbox("Guardar cada análisis", value=False,
+                              help=f"Instantánea Parquet por farmacia y fecha en {DIRECTORIO_HISTORICO}")
+        indice = obtener_historico().listar()
+        if indice.empty:
+            return fecha, guardar, None
+        opciones = [None] + list(zip(indice['farmacia'], indice['fecha'].dt.date))
+        elegida = st.selectbox("Abrir instantánea", opciones,
+                               format_func=lambda o: "—" if o is None else f"{o[0]} · {o[1]:%d/%m/%Y}",
+                               help="Se usa cuando no hay archivos cargados")
+    return fecha, guardar, elegida
+
+def mostrar_estado_cache():
+    """Estado de la caché de ingesta en la barra lateral"""
+    stats = obtener_cache_ingesta().estadisticas()
+    with st.sidebar.expander("🗄️ Caché de archivos"):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Aciertos", stats['aciertos'])
+            st.metric("Entradas", f"{stats['entradas']}/{CACHE_MAX_ENTRADAS}")
+        with col2:
+            st.metric("Fallos", stats['fallos'])
+            st.metric("Expulsiones", stats['expulsiones'])
+        st.caption(f"Memoria: {formato_numero(stats['memoria_mb'])} MB de {CACHE_MEMORIA_MB} MB · "
+                   f"TTL: {CACHE_TTL_SEGUNDOS // 3600} h")
+        if st.button("🧹 Vaciar caché", use_container_width=True, key="btn_vaciar_cache"):
+            obtener_cache_ingesta().limpiar()
+            st.rerun()
+
+def mostrar_opciones_diagnostico():
+    """Casillas del modo diagnóstico; se aplican a partir de la siguiente ejecución"""
+    with st.sidebar.expander("🐞 Diagnóstico"):
+        st.checkbox("Medir etapas", value=DIAGNOSTICO_POR_DEFECTO, key='diagnostico',
+                    help="Tiempo de cada etapa en un panel al final de la página y en el log")
+        st.checkbox("Medir memoria (más lento)", key='diagnostico_memoria',
+                    disabled=not st.session_state.get('diagnostico', DIAGNOSTICO_POR_DEFECTO),
+                    help="Pico de memoria reservada por etapa con tracemalloc")
+
+def mostrar_diagnostico(registro):
+    """Panel con el tiempo (y la memoria, si se mide) de cada etapa de la ejecución"""
+    with st.expander(f"🐞 Diagnóstico: {formato_numero(registro.segundos)} s"):
+        tabla = pd.DataFrame({
+            'Etapa': ['\u2003' * m['nivel'] + m['nombre'] for m in registro.etapas],
+            'Segundos': [m['segundos'] for m in registro.etapas],
+            '% del total': [100 * m['segundos'] / registro.segundos if registro.segundos else 0
+                            for m in registro.etapas],
+        })
+        if registro.memoria:
+            tabla['Pico memoria (MB)'] = [m['pico_mb'] for m in registro.etapas]
+        if any(m['rss_mb'] is not None for m in registro.etapas):
+            tabla['RSS máx. (MB)'] = [m['rss_mb'] for m in registro.etapas]
+        st.dataframe(tabla.round(3), use_container_width=True, hide_index=True)
+
 # ==================== INTERFAZ PRINCIPAL ====================
 def main():
+    """Ejecuta la página, midiendo sus etapas si el modo diagnóstico está activo"""
+    if not st.session_state.get('diagnostico', DIAGNOSTICO_POR_DEFECTO):
+        pagina()
+        return
+    
+    with registrar(memoria=st.session_state.get('diagnostico_memoria', False)) as registro:
+        contexto = pagina()
+    mostrar_diagnostico(registro)
+    LOG.info(registro.linea_log(**contexto))
+
+def pagina():
+    """Contenido de la página; devuelve el contexto de la ejecución para el log"""
     aplicar_estilos()
     
     st.title("📊 Análisis de Stock Farmacéutico")
@@ -470,6 +811,10 @@ def main():
     dias_abierto = st.sidebar.number_input("Días abierto al año", 250, 365, 300, 1)
     
     st.sidebar.markdown("### Parámetros Stock (A y B)")
+    tipo_pedido = st.sidebar.selectbox(
+        "Tipo de pedido", list(POLITICAS_STOCK),
+        help="Define los niveles mínimo, ideal y límite por categoría (ver POLITICAS_STOCK)"
+    )
     col1, col2 = st.sidebar.columns(2)
     with col1:
         stock_min_dias = st.number_input("Mín (días)", 5, 20, 10, 1)
@@ -478,35 +823,81 @@ def main():
     
     dias_cobertura = st.sidebar.slider("Días cobertura ideal", 10, 30, 15, 1)
     margen_seguridad = st.sidebar.slider("Margen seguridad (%)", 0.0, 0.30, 0.0, 0.05)
+    fecha_inventario, guardar, snapshot = mostrar_opciones_historico()
     
     # Upload
-    uploaded_file = st.file_uploader("📁 Cargar archivo Excel", type=['xlsx', 'xls'])
+    uploaded_files = st.file_uploader("📁 Cargar archivos Excel (uno o varias farmacias)",
+                                      type=['xlsx', 'xls'], accept_multiple_files=True)
     
-    if uploaded_file:
+    if uploaded_files or snapshot:
         try:
-            # CORRECCIÓN: Crear clave única basada en parámetros para invalidar caché
-            cache_key = f"{dias_abierto}_{stock_min_dias}_{stock_max_dias}_{dias_cobertura}_{margen_seguridad}"
+            if uploaded_files:
+                # Procesar datos (varios archivos en paralelo)
+                farmacias = elegir_farmacias(uploaded_files)
+                resultados = procesar_excels(uploaded_files, dias_abierto, stock_min_dias, stock_max_dias,
+                                             dias_cobertura, margen_seguridad, tipo_pedido, farmacias)
+                if guardar:
+                    guardar_historico(resultados, fecha_inventario)
+            else:
+                resultados = cargar_snapshot(*snapshot, dias_abierto, stock_min_dias, dias_cobertura,
+                                             margen_seguridad, tipo_pedido)
+            
+            if len(resultados) > 1:
+                mostrar_comparativa_farmacias(resultados)
+                st.markdown("---")
+                farmacia = st.selectbox("🏪 Farmacia a analizar", list(resultados))
+            else:
+                farmacia = next(iter(resultados))
+            df, cols = resultados[farmacia]
+            
+            if uploaded_files:
+                st.success(f"✅ Archivo procesado: {len(df):,} productos".replace(",", "."))
+            else:
+                productos = f"{len(df):,}".replace(",", ".")
+                st.success(f"✅ Instantánea de {farmacia} del {snapshot[1]:%d/%m/%Y}: {productos} productos")
+            lectura = df.attrs.get('lectura')
+            memoria = df.attrs.get('memoria')
+            if lectura and memoria:
+                st.caption(f"Leído con {lectura['motor']} ({lectura['formato']}) en "
+                           f"{formato_numero(lectura['segundos'])} s · Memoria: "
+                           f"{formato_numero(memoria['bytes_antes'] / 1024 ** 2)} MB → "
+                           f"{formato_numero(memoria['bytes_despues'] / 1024 ** 2)} MB")
             
-            # Procesar datos
-            df, cols = procesar_excel(uploaded_file, dias_abierto, stock_min_dias, 
-                                     stock_max_dias, dias_cobertura, margen_seguridad)
+            mostrar_busqueda(resultados)
             
-            st.success(f"✅ Archivo procesado: {len(df):,} productos".replace(",", "."))
+            # Agregados compartidos por todas las secciones
+            cubo = construir_cubo(df, cols)
             
             # Mostrar componentes
-            mostrar_resumen_ejecutivo(df, cols['stock_actual'])
+            mostrar_resumen_ejecutivo(cubo)
             st.markdown("---")
-            grafico_distribucion_categorias(df, cols)
+            grafico_distribucion_categorias(df, cols, cubo)
             st.markdown("---")
-            grafico_comparativa_stock(df, cols)
-            analisis_familias(df, cols)
-            botones_exportacion(df, cols)
+            grafico_comparativa_stock(cubo, cols)
+            analisis_familias(cubo, cols)
+            mostrar_detalle_productos(df, cols)
+            mostrar_evolucion(farmacia)
+            mostrar_cambios(farmacia, df, cols, fecha_inventario if uploaded_files else snapshot[1],
+                            dias_abierto, stock_min_dias, dias_cobertura, margen_seguridad, tipo_pedido)
+            botones_exportacion(df, cols, cubo)
             
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
             st.exception(e)
     else:
         st.info("👆 Cargue un archivo Excel para comenzar")
+    
+    mostrar_estado_cache()
+    mostrar_opciones_diagnostico()
+    
+    return {
+        'archivos': [archivo.name for archivo in uploaded_files or []],
+        'tipo_pedido': tipo_pedido,
+        'dias_abierto': dias_abierto,
+        'stock_min_dias': stock_min_dias,
+        'dias_cobertura': dias_cobertura,
+        'margen_seguridad': margen_seguridad,
+    }
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from gestion_stock import compactar_tipos
+
+COLS = {'total': 'TOTAL', 'stock_actual': 'Stock', 'pvp': 'PVP', 'cn': 'CN',
+        'descripcion': 'Descripcion', 'categoria_funcional': None}
+
+
+@pytest.fixture
+def cols():
+    return dict(COLS)
+
+
+@pytest.fixture
+def ingerido():
+    """DataFrame como el de la ingesta (tipos compactos) a partir de stock, PVP y ventas"""
+    def crear(stock, pvp, ventas, categorias=None, familias=None, descripciones=None):
+        n = len(stock)
+        df = pd.DataFrame({
+            'CN': np.arange(n) + 100000,
+            'Descripcion': descripciones if descripciones is not None else [f"Producto {i}" for i in range(n)],
+            'Stock': stock,
+            'PVP': pvp,
+            'TOTAL': ventas,
+            'Total_Ventas': ventas,
+            'Categoria': categorias if categorias is not None else ['A'] * n,
+            'Familia': familias if familias is not None else ['DERMO'] * n,
+        })
+        df['Subfamilia'] = df['Familia'] + '-GENERAL'
+        return compactar_tipos(df, COLS)[0]
+    return crear
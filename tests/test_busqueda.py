@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from gestion_stock import IndiceBusqueda, normalizar_textos
+
+
+def test_normalizar_sin_acentos_ni_signos():
+    textos = normalizar_textos(["Crema AÑIL-Pies 50ml", None, "  Protección   SOLAR  "]).to_pylist()
+    assert textos == ["crema anil pies 50ml", "", "proteccion solar"]
+
+def test_indice_vacio():
+    indice = IndiceBusqueda(pd.Series([], dtype='Int64'), pd.Series([], dtype=object))
+    for consulta in ["crema", "12", ""]:
+        filas, puntuacion = indice.buscar(consulta)
+        assert len(filas) == 0 and len(puntuacion) == 0
+
+def test_descripciones_vacias():
+    indice = IndiceBusqueda(pd.Series([1, 2]), pd.Series(["", None]))
+    assert len(indice.buscar("crema")[0]) == 0
+    assert indice.buscar("2")[0].tolist() == [1]
+
+def test_acentos_y_mayusculas():
+    descripciones = pd.Series(["Protección solar niños", "CREMA PIES", "Champú anticaspa", "Crema manos"])
+    indice = IndiceBusqueda(pd.Series([111111, 222222, 333333, 222299]), descripciones)
+    assert indice.buscar("proteccion")[0][0] == 0
+    assert indice.buscar("CHAMPU")[0][0] == 2
+    # Con una errata sigue encontrando la descripción
+    assert indice.buscar("cremma pies")[0][0] == 1
+    # CN exacto antes que los que solo empiezan igual
+    filas, puntuacion = indice.buscar("222222")
+    assert filas[0] == 1 and puntuacion[0] > puntuacion[1:].max(initial=0)
+    assert sorted(indice.buscar("2222")[0].tolist()) == [1, 3]
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from gestion_stock import CATEGORIAS, comparar_analisis, migraciones_categoria, resumen_diferencias
+
+
+def analisis(cns, stock, categorias, cols, familias=None):
+    """Análisis mínimo (df, cols) con las columnas que usa la comparación"""
+    n = len(cns)
+    df = pd.DataFrame({
+        'CN': cns,
+        'Descripcion': [f"Producto {cn}" for cn in cns],
+        'Stock': np.asarray(stock, dtype=float),
+        'Categoria': categorias,
+        'Familia': familias if familias is not None else ['DERMO'] * n,
+        'Stock_Sobrante': np.asarray(stock, dtype=float) * 2,
+        'Stock_Faltante': np.zeros(n),
+    })
+    df['Subfamilia'] = df['Familia'].astype(str) + '-GENERAL'
+    return df, cols
+
+def test_cns_numericos_nuevos_retirados_y_deltas(cols):
+    anterior = analisis([100, 200, 300], [5, 1, 4], ['A', 'C', 'B'], cols)
+    actual = analisis([300, 400, 200], [6, 2, 1], ['A', 'D', 'C'], cols)
+    diferencias = comparar_analisis(anterior, actual)
+    
+    assert diferencias.index.tolist() == [100, 200, 300, 400]
+    assert diferencias['Estado'].tolist() == ['Retirado', 'Continúa', 'Continúa', 'Nuevo']
+    assert diferencias['Stock_Anterior'].tolist() == [5, 1, 4, 0]
+    assert diferencias['Stock_Actual'].tolist() == [0, 1, 6, 2]
+    assert diferencias['Delta_Stock'].tolist() == [-5, 0, 2, 2]
+    assert diferencias['Delta_Stock_Sobrante'].tolist() == [-10, 0, 4, 4]
+    assert diferencias['Categoria_Anterior'].astype(object).tolist()[:3] == ['A', 'C', 'B']
+    assert pd.isna(diferencias['Categoria_Anterior'].iloc[3])
+    assert pd.isna(diferencias['Categoria_Actual'].iloc[0])
+    # La categoría es la actual salvo para los retirados
+    assert diferencias['Categoria'].astype(object).tolist() == ['A', 'C', 'A', 'D']
+    assert diferencias['Cambia_Categoria'].tolist() == [False, False, True, False]
+    assert diferencias['Descripcion'].tolist() == [f"Producto {cn}" for cn in (100, 200, 300, 400)]
+
+def test_cns_numericos_y_de_texto_coinciden(cols):
+    anterior = analisis([123456.0, 7, 55], [3, 1, 2], ['A', 'B', 'C'], cols)
+    actual = analisis(['123456', ' 7 ', 'X-55'], [4, 1, 2], ['A', 'B', 'C'], cols)
+    diferencias = comparar_analisis(anterior, actual)
+    
+    estados = dict(zip(diferencias.index, diferencias['Estado']))
+    assert estados == {'123456': 'Continúa', '7': 'Continúa', '55': 'Retirado', 'X-55': 'Nuevo'}
+    assert diferencias.loc['123456', 'Delta_Stock'] == 1
+    
+    # Dos exportaciones con CN entero y decimal se comparan como enteros
+    decimales = analisis([123456.0, 7.0], [3, 1], ['A', 'B'], cols)
+    enteros = analisis(np.array([123456, 7], dtype=np.int32), [3, 1], ['A', 'B'], cols)
+    assert (comparar_analisis(decimales, enteros)['Estado'] == 'Continúa').all()
+
+def test_cns_repetidos_suman_medidas_y_toman_la_primera_fila(cols):
+    anterior = analisis([1, 1, 2], [2, 3, 5], ['A', 'C', 'B'], cols)
+    actual = analisis([1, 2, 2, 2], [4, 1, 1, 1], ['B', 'B', 'A', 'A'], cols)
+    diferencias = comparar_analisis(anterior, actual)
+    
+    assert diferencias.index.tolist() == [1, 2]
+    assert diferencias['Stock_Anterior'].tolist() == [5, 5]
+    assert diferencias['Stock_Actual'].tolist() == [4, 3]
+    assert diferencias['Categoria_Anterior'].astype(object).tolist() == ['A', 'B']
+    assert diferencias['Categoria_Actual'].astype(object).tolist() == ['B', 'B']
+    assert diferencias['Cambia_Categoria'].tolist() == [True, False]
+
+def test_referencias_solo_en_un_analisis(cols):
+    anterior = analisis([1, 2], [2, 3], ['A', 'B'], cols)
+    vacio = analisis([], [], [], cols)
+    
+    retirados = comparar_analisis(anterior, vacio)
+    assert (retirados['Estado'] == 'Retirado').all()
+    assert retirados['Delta_Stock'].tolist() == [-2, -3]
+    assert not retirados['Cambia_Categoria'].any()
+    
+    nuevos = comparar_analisis(vacio, anterior)
+    assert (nuevos['Estado'] == 'Nuevo').all()
+    assert nuevos['Delta_Stock'].tolist() == [2, 3]
+    assert nuevos['Categoria'].astype(object).tolist() == ['A', 'B']
+    
+    sin_cn = dict(cols, cn=None)
+    with pytest.raises(ValueError):
+        comparar_analisis(anterior, (anterior[0], sin_cn))
+
+def test_migraciones_y_resumen(cols):
+    anterior = analisis([1, 2, 3, 4, 5], [1, 1, 1, 1, 1], ['A', 'A', 'B', 'E', 'C'], cols,
+                        familias=['DERMO', 'DERMO', 'BEBE', 'BEBE', 'BEBE'])
+    actual = analisis([1, 2, 3, 4, 6], [2, 1, 1, 0, 3], ['A', 'B', 'B', 'D', 'A'], cols,
+                      familias=['DERMO', 'DERMO', 'BEBE', 'BEBE', 'DERMO'])
+    diferencias = comparar_analisis(anterior, actual)
+    
+    migraciones = migraciones_categoria(diferencias)
+    assert migraciones.index.tolist() == CATEGORIAS and migraciones.columns.tolist() == CATEGORIAS
+    # Solo cuentan los CN que siguen: 5 (retirado) y 6 (nuevo) no
+    assert migraciones.to_numpy().sum() == 4
+    assert migraciones.loc['A', 'A'] == 1
+    assert migraciones.loc['A', 'B'] == 1
+    assert migraciones.loc['B', 'B'] == 1
+    assert migraciones.loc['E', 'D'] == 1
+    
+    resumen = resumen_diferencias(diferencias)
+    assert resumen.loc['A', ['Refs', 'Nuevos', 'Retirados', 'Cambian_Categoria']].tolist() == [2, 1, 0, 0]
+    assert resumen.loc['B', ['Refs', 'Cambian_Categoria', 'Delta_Stock']].tolist() == [2, 1, 0]
+    assert resumen.loc['C', ['Refs', 'Retirados', 'Delta_Stock']].tolist() == [1, 1, -1]
+    assert resumen['Refs'].sum() == len(diferencias)
+    assert resumen['Delta_Stock'].sum() == diferencias['Delta_Stock'].sum()
+    
+    familias = resumen_diferencias(diferencias, 'Familia')
+    assert familias.loc['DERMO', ['Refs', 'Nuevos', 'Delta_Stock']].tolist() == [3, 1, 4]
+    assert familias.loc['BEBE', ['Refs', 'Retirados', 'Delta_Stock']].tolist() == [3, 1, -2]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from gestion_stock import filas_filtradas, pagina_detalle
+
+COLUMNAS = ['CN', 'Categoria', 'Stock_Sobrante']
+
+
+def detalle(n):
+    return pd.DataFrame({
+        'CN': np.arange(n) + 100000,
+        'Categoria': pd.Categorical((['A', 'B', 'C'] * n)[:n]),
+        'Stock_Sobrante': np.arange(n) * 1.005,
+    })
+
+def test_frame_vacio():
+    vista, total = pagina_detalle(detalle(0), COLUMNAS, 0, 50, orden='Stock_Sobrante')
+    assert total == 0
+    assert vista.empty and vista.columns.tolist() == COLUMNAS
+
+def test_ultima_pagina_incompleta():
+    df = detalle(120)
+    vista, total = pagina_detalle(df, COLUMNAS, 2, 50)
+    assert total == 120
+    assert vista['CN'].tolist() == (df['CN'].to_numpy()[100:]).tolist()
+    
+    filas = filas_filtradas(df, {'Categoria': ['A']})
+    vista, total = pagina_detalle(df, COLUMNAS, 1, 25, 'Stock_Sobrante', False, filas)
+    assert total == 40
+    assert len(vista) == 15
+    assert vista['Stock_Sobrante'].tolist() == df['Stock_Sobrante'].iloc[filas[::-1][25:]].round(2).tolist()
+
+def test_pagina_fuera_de_rango():
+    df = detalle(120)
+    for filas in (None, filas_filtradas(df, {'Categoria': ['B']})):
+        vista, total = pagina_detalle(df, COLUMNAS, 3, 50, filas=filas)
+        assert vista.empty and vista.columns.tolist() == COLUMNAS
+        assert total == (120 if filas is None else 40)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from gestion_stock import IndiceFiltros, filas_filtradas
+
+
+def datos(n=1003, semilla=0):
+    rng = np.random.default_rng(semilla)
+    familias = np.array(['DERMO', 'SOLARES', 'INFANTIL', 'OTROS'])[rng.integers(0, 4, n)]
+    subfamilias = pd.Series(familias) + '-' + np.array(['ACNE', 'PIES', 'BEBE'])[rng.integers(0, 3, n)]
+    df = pd.DataFrame({
+        'Categoria': pd.Categorical(np.array(list('ABCDE'))[rng.integers(0, 5, n)], categories=list('ABCDE')),
+        'Familia': pd.Categorical(familias),
+        'Subfamilia': subfamilias.where(rng.random(n) > 0.05),  # algunas sin subfamilia
+    })
+    return df
+
+def test_igual_que_isin():
+    df = datos()
+    indice = IndiceFiltros(df)
+    rng = np.random.default_rng(1)
+    familias, subfamilias = indice.valores('Familia'), indice.valores('Subfamilia')
+    for _ in range(200):
+        filtros = {
+            'Categoria': list(rng.choice(list('ABCDEX'), rng.integers(0, 3))),
+            'Familia': list(rng.choice(familias, rng.integers(0, 3))),
+            'Subfamilia': list(rng.choice(subfamilias, rng.integers(0, 4))) if rng.random() < 0.5 else [],
+        }
+        mascara = np.ones(len(df), dtype=bool)
+        for columna, valores in filtros.items():
+            if valores:
+                mascara &= df[columna].isin(valores).to_numpy()
+        esperado = np.flatnonzero(mascara)
+        np.testing.assert_array_equal(indice.filas_filtradas(filtros), esperado)
+        np.testing.assert_array_equal(filas_filtradas(df, filtros, indice), esperado)
+        np.testing.assert_array_equal(filas_filtradas(df, filtros), esperado)
+        assert indice.contar(filtros) == len(esperado)
+
+def test_valores_presentes():
+    df = datos()
+    indice = IndiceFiltros(df)
+    assert indice.valores('Familia') == sorted(df['Familia'].unique())
+    esperado = sorted(df.loc[df['Familia'] == 'DERMO', 'Subfamilia'].dropna().unique())
+    assert indice.valores('Subfamilia', {'Familia': ['DERMO']}) == esperado
+
+def test_sin_filas():
+    indice = IndiceFiltros(datos(0))
+    assert indice.filas_filtradas({'Categoria': ['A']}).tolist() == []
+    assert indice.valores('Familia') == []
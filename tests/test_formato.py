@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from gestion_stock import formatear_euros, formatear_numeros, formato_euros, formato_numero
+
+
+def test_empates_como_format():
+    # x.xx5 no es exacto en binario: format() redondea el valor real, no el escalado
+    valores = [829224.405, 1430596.615, 0.005, 0.015, 2.675, -1.005, 1.125, -0.0, 0.0]
+    assert formatear_numeros(valores).tolist() == [formato_numero(v) for v in valores]
+
+@pytest.mark.parametrize('decimales', [0, 1, 2, 3])
+def test_igual_que_formato_numero(decimales):
+    rng = np.random.default_rng(decimales)
+    valores = np.concatenate([
+        rng.uniform(-2e6, 2e6, 20000).round(decimales + 1),  # empates .xx5
+        rng.uniform(-2e6, 2e6, 20000),
+        rng.integers(-10 ** 9, 10 ** 9, 5000) / 1000,
+        [1e17, -3e25, 123456789012345.675, 999.995, -999.995],
+    ])
+    esperado = [formato_numero(v, decimales) for v in valores.tolist()]
+    assert formatear_numeros(valores, decimales).tolist() == esperado
+
+def test_euros_y_nulos():
+    serie = pd.Series([1234.5, np.nan, -0.004, np.inf], index=[3, 1, 2, 0], name='Exceso')
+    resultado = formatear_euros(serie)
+    assert resultado.index.equals(serie.index) and resultado.name == 'Exceso'
+    assert resultado.iloc[0] == formato_euros(1234.5) == "1.234,50€"
+    assert resultado.iloc[2] == formato_euros(-0.004)
+    assert resultado.isna().tolist() == [False, True, False, True]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from gestion_stock import AlmacenSnapshots, COLUMNAS_NIVELES, calcular_niveles
+from gestion_stock.historico import PARAMETROS_TOTALES, totales_snapshot
+
+
+def procesado(df, cols, dias_cobertura):
+    return calcular_niveles(df, cols, 300, 10, dias_cobertura, 0.0)
+
+def test_parametros_no_reescriben_la_instantanea(tmp_path, ingerido, cols):
+    df = ingerido([200, 3, 0], [12.5, 4, 7], [5000, 7, 1])
+    almacen = AlmacenSnapshots(tmp_path)
+    primera = almacen.guardar(procesado(df, cols, 15), cols, 'Centro', '2025-06-30', huella='excel-1')
+    ruta = tmp_path / primera['ruta']
+    modificado = ruta.stat().st_mtime_ns
+    
+    # Otro valor de los sliders con el mismo Excel: misma entrada, sin escribir
+    segunda = almacen.guardar(procesado(df, cols, 30), cols, 'Centro', '2025-06-30', huella='excel-1')
+    assert segunda == primera
+    assert ruta.stat().st_mtime_ns == modificado
+
+def test_instantanea_sin_niveles_y_totales_de_referencia(tmp_path, ingerido, cols):
+    df = ingerido([200, 3, 0], [12.5, 4, 7], [5000, 7, 1])
+    almacen = AlmacenSnapshots(tmp_path)
+    entrada = almacen.guardar(procesado(df, cols, 30), cols, 'Centro', '2025-06-30', huella='excel-1')
+    
+    cargado, _ = almacen.cargar('Centro', '2025-06-30')
+    assert not set(COLUMNAS_NIVELES) & set(cargado.columns)
+    pd.testing.assert_frame_equal(cargado, df, check_dtype=False, check_categorical=False)
+    # Los totales no dependen de los parámetros del análisis guardado
+    assert entrada['exceso'] == totales_snapshot(df, cols)['exceso']
+    assert entrada['parametros']['dias_cobertura'] == PARAMETROS_TOTALES.dias_cobertura
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from pathlib import Path
+
+import pytest
+
+from gestion_stock.lote import asignar_farmacias
+
+ARCHIVOS = [Path('exportaciones/centro_20250630.xlsx'), Path('exportaciones/norte_20250630.xlsx')]
+
+
+def test_farmacia_por_defecto_es_el_nombre_del_archivo():
+    assert asignar_farmacias(ARCHIVOS, None) == {ARCHIVOS[0]: 'centro_20250630', ARCHIVOS[1]: 'norte_20250630'}
+
+def test_farmacia_por_archivo_con_o_sin_extension():
+    farmacias = asignar_farmacias(ARCHIVOS, ['centro_20250630.xlsx=Farmacia Centro', 'norte_20250630=Norte'])
+    assert farmacias == {ARCHIVOS[0]: 'Farmacia Centro', ARCHIVOS[1]: 'Norte'}
+
+def test_nombre_sin_archivo_solo_con_un_archivo():
+    assert asignar_farmacias(ARCHIVOS[:1], ['Centro']) == {ARCHIVOS[0]: 'Centro'}
+    with pytest.raises(ValueError):
+        asignar_farmacias(ARCHIVOS, ['Centro'])
+
+def test_archivo_desconocido_o_nombre_vacio():
+    for valor in ['sur.xlsx=Sur', 'centro_20250630.xlsx=  ']:
+        with pytest.raises(ValueError):
+            asignar_farmacias(ARCHIVOS, [valor])
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from gestion_stock import Parametros, calcular_niveles
+
+
+def niveles(df, cols, parametros=Parametros()):
+    return calcular_niveles(df, cols, parametros.dias_abierto, parametros.stock_min_dias,
+                            parametros.dias_cobertura, parametros.margen_seguridad, parametros.tipo_pedido)
+
+def test_compactar_estrecha_cantidades_y_pvp(ingerido):
+    df = ingerido([200, 3], [250, 4], [5000, 7])
+    assert df['Stock'].dtype == np.int16
+    assert df['PVP'].dtype == np.int16
+    assert df['Total_Ventas'].dtype == np.int16
+
+def test_valores_sin_desbordamiento_con_tipos_estrechos(ingerido, cols):
+    # 200 uds × 250 € y 5000 uds × 250 € no caben en int16
+    resultado = niveles(ingerido([200, 3], [250, 4], [5000, 7]), cols)
+    assert resultado['Valor_Stock_Actual'].tolist() == [50000.0, 12.0]
+    assert resultado['Valor_Ventas'].tolist() == [1250000.0, 28.0]
+    for columna in ['Vtas_Dia', 'Valor_Stock_Actual', 'Valor_Ventas', 'Stock_Sobrante', 'Stock_Faltante']:
+        assert resultado[columna].dtype == np.float64
+
+def test_valores_iguales_sin_compactar(ingerido, cols):
+    rng = np.random.default_rng(0)
+    n = 2000
+    stock = rng.integers(0, 400, n)
+    pvp = rng.integers(1, 4000, n) / 4  # cuartos de euro: PVP en float32 sin pérdida
+    ventas = rng.integers(0, 6000, n)
+    compacto = niveles(ingerido(stock, pvp, ventas), cols)
+    assert compacto['PVP'].dtype == np.float32
+    
+    df = ingerido(stock, pvp, ventas)
+    for columna in ['Stock', 'PVP', 'TOTAL', 'Total_Ventas']:
+        df[columna] = df[columna].astype(np.float64)
+    ancho = niveles(df, cols)
+    for columna in ['Valor_Stock_Actual', 'Valor_Ventas', 'Stock_Sobrante', 'Stock_Faltante',
+                    'Stock_Ideal', 'Indice_Rotacion']:
+        np.testing.assert_array_equal(compacto[columna].to_numpy(), ancho[columna].to_numpy())
+    assert compacto['Valor_Stock_Actual'].sum() == float(np.sum(stock * pvp))
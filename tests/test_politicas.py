@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from gestion_stock import CATEGORIAS, POLITICAS_STOCK, TIPO_PEDIDO_DEFECTO, calcular_niveles
+
+DIAS_ABIERTO = 300
+STOCK_MIN_DIAS = 10
+VENTAS = [0, 7, 113, 2250, 2250, 113]
+STOCK = [0, 1, 5, 40, 3, 200]
+
+
+def referencia_stock7(cat, vtas_dia, dias_cobertura, stock_min_dias, margen_seguridad):
+    """calcular_stocks_por_categoria de stock7.py antes de la matriz de políticas"""
+    if cat == 'A' or cat == 'B':
+        stock_ideal = vtas_dia * dias_cobertura
+        stock_min = vtas_dia * stock_min_dias
+        stock_limite = stock_ideal * (1 + margen_seguridad)
+    elif cat == 'C':
+        stock_ideal = 1
+        stock_min = 1
+        stock_limite = 1 * (1 + margen_seguridad)
+    elif cat == 'D':
+        stock_ideal = 1
+        stock_min = 0
+        stock_limite = 1 * (1 + margen_seguridad)
+    else:  # E
+        stock_ideal = 0
+        stock_min = 0
+        stock_limite = 0
+    return round(stock_min, 1), round(stock_ideal, 1), round(stock_limite, 1)
+
+def referencia_stock(cat, vtas_dia, tipo_pedido, dias_cobertura):
+    """calcular_stocks de stock.py (máximo = límite, óptimo = ideal)"""
+    if cat == 'A' or cat == 'B':
+        if tipo_pedido == 'Mayorista Club Genericos':
+            stock_min, stock_max, stock_opt = vtas_dia * 2, vtas_dia * 3, vtas_dia * 2.5
+        elif tipo_pedido == 'Directo Transfer':
+            stock_min, stock_max, stock_opt = vtas_dia * 8, vtas_dia * 15, vtas_dia * dias_cobertura
+        elif tipo_pedido == 'Grupo Compras/Plataforma' and cat == 'A':
+            stock_min, stock_max, stock_opt = vtas_dia * 3, vtas_dia * 15, vtas_dia * dias_cobertura
+        elif tipo_pedido == 'Grupo Compras/Plataforma':
+            stock_min, stock_max, stock_opt = vtas_dia * 3, vtas_dia * 9, vtas_dia * min(dias_cobertura, 9)
+        else:  # Especiales
+            stock_min, stock_max, stock_opt = vtas_dia * 1, vtas_dia * 2, vtas_dia * 1.5
+    elif cat == 'C':
+        stock_min, stock_max, stock_opt = 1, 2, 1
+    elif cat == 'D':
+        stock_min, stock_max, stock_opt = 0, 1, 1
+    else:  # E
+        stock_min, stock_max, stock_opt = 0, 0, 0
+    return round(stock_min, 1), round(stock_opt, 1), round(stock_max, 1)
+
+def referencia(cat, vtas_dia, tipo_pedido, dias_cobertura, margen_seguridad):
+    if tipo_pedido == TIPO_PEDIDO_DEFECTO:
+        return referencia_stock7(cat, vtas_dia, dias_cobertura, STOCK_MIN_DIAS, margen_seguridad)
+    return referencia_stock(cat, vtas_dia, tipo_pedido, dias_cobertura)
+
+@pytest.mark.parametrize('dias_cobertura, margen_seguridad', [(15, 0.0), (6, 0.2), (20, 0.35)])
+@pytest.mark.parametrize('categoria', CATEGORIAS)
+@pytest.mark.parametrize('tipo_pedido', list(POLITICAS_STOCK))
+def test_matriz_igual_que_formulas_originales(ingerido, cols, tipo_pedido, categoria,
+                                               dias_cobertura, margen_seguridad):
+    df = ingerido(STOCK, [2.5] * len(STOCK), VENTAS, categorias=[categoria] * len(STOCK))
+    resultado = calcular_niveles(df, cols, DIAS_ABIERTO, STOCK_MIN_DIAS, dias_cobertura,
+                                 margen_seguridad, tipo_pedido)
+    
+    esperado = np.array([referencia(categoria, ventas / DIAS_ABIERTO, tipo_pedido, dias_cobertura,
+                                    margen_seguridad) for ventas in VENTAS])
+    niveles = resultado[['Stock_Min_Calc', 'Stock_Ideal', 'Stock_Limite']].to_numpy()
+    np.testing.assert_array_equal(niveles, esperado)
+    np.testing.assert_array_equal(resultado['Stock_Sobrante_Uds'].to_numpy(),
+                                  np.maximum(0, np.array(STOCK) - esperado[:, 1]))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from gestion_stock import filas_mayores, mayores, posiciones_mayores, productos_con_exceso
+
+
+def orden_completo(serie, k):
+    return serie.sort_values(ascending=False, kind='stable', na_position='last').head(k)
+
+def test_mayores_igual_que_ordenar():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        n = int(rng.integers(0, 40))
+        valores = rng.integers(-3, 4, n).astype(float)
+        valores[rng.random(n) < 0.2] = np.nan
+        valores[rng.random(n) < 0.1] = -np.inf
+        serie = pd.Series(valores, index=rng.permutation(n) + 10)
+        k = int(rng.integers(0, 45))
+        assert mayores(serie, k).index.equals(orden_completo(serie, k).index)
+
+def test_posiciones_con_filas_candidatas():
+    valores = np.array([5.0, 1.0, 9.0, 9.0, np.nan, 3.0])
+    filas = np.array([1, 3, 4, 5])
+    assert posiciones_mayores(valores, 2, filas).tolist() == [3, 5]
+    assert posiciones_mayores(valores, 10, filas).tolist() == [3, 5, 1, 4]
+
+def test_filas_mayores_y_productos_con_exceso():
+    df = pd.DataFrame({'Stock_Sobrante_Uds': [0, 2, 1, 5, 3],
+                       'Stock_Sobrante': [50.0, 20.0, 10.0, 20.0, 40.0]})
+    assert filas_mayores(df, 'Stock_Sobrante', 2).index.tolist() == [0, 4]
+    limitado = productos_con_exceso(df, limite=2)
+    assert limitado.index.tolist() == [4, 1]
+    assert productos_con_exceso(df).head(2).index.tolist() == limitado.index.tolist()
+
+def test_productos_con_exceso_empates_iguales_con_y_sin_limite():
+    rng = np.random.default_rng(1)
+    n = 5000
+    df = pd.DataFrame({'Stock_Sobrante_Uds': rng.integers(0, 3, n),
+                       'Stock_Sobrante': rng.integers(0, 20, n) * 2.5},
+                      index=rng.permutation(n))
+    df.loc[df.index[rng.random(n) < 0.05], 'Stock_Sobrante'] = np.nan
+    completo = productos_con_exceso(df)
+    for limite in [0, 1, 37, 500, n]:
+        assert productos_con_exceso(df, limite).index.equals(completo.head(limite).index)